@@ -10,6 +10,8 @@ def get_lsb_index(bitboard: np.uint64) -> int:
     if bitboard == 0:
         return -1
     
-    lsb_uint64 = bitboard & -bitboard
+    # Negating a np.uint64 overflows, so the isolation is done on a python int
+    bitboard = int(bitboard)
+    lsb = bitboard & -bitboard
     
-    return int(lsb_uint64).bit_length() - 1
\ No newline at end of file
+    return lsb.bit_length() - 1
\ No newline at end of file
@@ -1,7 +1,8 @@
 import numpy as np
-from constants import Piece, Colour
-from move_generator import MoveGenerator
-from bitboard_helper import get_lsb_index
+from constants import Piece, Colour, MoveFlags, Castling
+from move import decode_source, decode_target, decode_flag
+from zobrist import PIECE_KEYS, SIDE_KEY, CASTLING_KEYS, EP_KEYS, compute_hash, compute_pawn_hash
+from evaluation import MG_TABLE, EG_TABLE, PHASE_WEIGHTS, compute_scores
 
 """
 56 57 58 59 60 61 62 63         A8 B8 C8 D8 E8 F8 G8 H8
@@ -14,10 +15,26 @@ from bitboard_helper import get_lsb_index
  0  1  2  3  4  5  6  7         A1 B1 C1 D1 E1 F1 G1 H1
 """
 
+# Mailbox entries hold (colour << 3) | piece for an occupied square
+EMPTY_SQUARE = 0xFF
+PIECES = tuple(Piece)
+COLOURS = tuple(Colour)
+# FEN characters, lowercase for black and uppercase for white
+PIECES_BY_CHAR = {piece.to_char(): piece for piece in Piece}
+CASTLING_BY_CHAR = {"K": Castling.WK, "Q": Castling.WQ, "k": Castling.BK, "q": Castling.BQ}
+
 class Board:
+    __slots__ = ("bitboards", "side_to_move", "ep_target", "castling_rights", "castling_masks", "history", "zobrist_key", "pawn_key", "mailbox",
+                 "occupancy", "colour_occupancy", "mg_score", "eg_score", "phase", "halfmove_clock", "fullmove_number")
+    
+    # When set, every make_move and unmake_move checks that the incrementally updated state
+    # matches a recompute from the bitboards. Far too slow for anything but debugging
+    debug = False
+    
     def __init__(self):
         # Index 0 for white piece, index 1 for black Piece. Each colour has 6 bitboards 
-        self.bitboards = np.zeros((2,6), dtype=np.uint64) 
+        self.bitboards = self._empty_bitboards()
+        self.side_to_move = Colour.WHITE
         # Square index which a pawn can move to in order to en passant
         self.ep_target = -1
         
@@ -27,6 +44,10 @@ class Board:
         # 0100 = Black King Side
         # 1000 = Black Queen Side
         self.castling_rights = 0b1111
+        # Plies since the last capture or pawn move, for the fifty move rule, and the number of the
+        # current move, which starts at 1 and goes up after black moves
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
         
         self.castling_masks = [0b1111] * 64
         # A1, remove white queen side castling
@@ -36,134 +57,400 @@ class Board:
         # H1, remove white king side castling
         self.castling_masks[7] = 0b1110
         # A8, remove black queen side castling
-        self.castling_masks[56] = 0b1011
+        self.castling_masks[56] = 0b0111
         # E8, remove all black castling
         self.castling_masks[60] = 0b0011
         # H8, remove black king side castling
         self.castling_masks[63] = 0b1011
         
+        # Undo stack of (move, moved piece, captured piece, castling rights, ep target, zobrist key,
+        # mg score, eg score, phase, pawn key, halfmove clock) for each move made, so that unmake_move can restore the previous position
+        self.history = []
+        # 64 bit position key, updated incrementally by make_move
+        self.zobrist_key = 0
+        # Key of the pawns alone, updated incrementally by make_move. See pawn_structure.py
+        self.pawn_key = 0
+        # What is on each square, kept in sync with the bitboards so lookups by square don't
+        # have to search through all twelve of them
+        self.mailbox = bytearray([EMPTY_SQUARE] * 64)
+        # Occupancy of each colour and of the whole board as python ints, kept up to date by
+        # make_move and unmake_move rather than reduced from the bitboards on every call
+        self.colour_occupancy = [0, 0]
+        self.occupancy = 0
+        # Material and piece-square scores of the middlegame and endgame from white's point of view,
+        # and the game phase, updated incrementally by make_move. See evaluation.py
+        self.mg_score = 0
+        self.eg_score = 0
+        self.phase = 0
+        
         self.reset_board()
         
         
+    def _empty_bitboards(self):
+        return np.zeros((2,6), dtype=np.uint64)
+        
+        
     def reset_board(self):
-        self.bitboards.fill(0)
+        # Plain ints are assigned so this works for any bitboard storage
+        for colour in Colour:
+            for piece in Piece:
+                self.bitboards[colour][piece] = 0
         
-        self.bitboards[Colour.WHITE][Piece.PAWN] = np.uint64(0b11111111) << np.uint64(8)
-        self.bitboards[Colour.BLACK][Piece.PAWN] = np.uint64(0b11111111) << np.uint64(48)
+        self.bitboards[Colour.WHITE][Piece.PAWN] = 0b11111111 << 8
+        self.bitboards[Colour.BLACK][Piece.PAWN] = 0b11111111 << 48
         
-        self.bitboards[Colour.WHITE][Piece.KNIGHT] = np.uint64(0b01000010)
-        self.bitboards[Colour.BLACK][Piece.KNIGHT] = np.uint64(0b01000010) << np.uint64(56)
+        self.bitboards[Colour.WHITE][Piece.KNIGHT] = 0b01000010
+        self.bitboards[Colour.BLACK][Piece.KNIGHT] = 0b01000010 << 56
         
-        self.bitboards[Colour.WHITE][Piece.BISHOP] = np.uint64(0b00100100)
-        self.bitboards[Colour.BLACK][Piece.BISHOP] = np.uint64(0b00100100) << np.uint64(56)
+        self.bitboards[Colour.WHITE][Piece.BISHOP] = 0b00100100
+        self.bitboards[Colour.BLACK][Piece.BISHOP] = 0b00100100 << 56
        
-        self.bitboards[Colour.WHITE][Piece.ROOK] = np.uint64(0b10000001)
-        self.bitboards[Colour.BLACK][Piece.ROOK] = np.uint64(0b10000001) << np.uint64(56)
+        self.bitboards[Colour.WHITE][Piece.ROOK] = 0b10000001
+        self.bitboards[Colour.BLACK][Piece.ROOK] = 0b10000001 << 56
          
-        self.bitboards[Colour.WHITE][Piece.QUEEN] = np.uint64(0b00001000)
-        self.bitboards[Colour.BLACK][Piece.QUEEN] = np.uint64(0b00001000) << np.uint64(56)
+        self.bitboards[Colour.WHITE][Piece.QUEEN] = 0b00001000
+        self.bitboards[Colour.BLACK][Piece.QUEEN] = 0b00001000 << 56
         
-        self.bitboards[Colour.WHITE][Piece.KING] = np.uint64(0b00010000)
-        self.bitboards[Colour.BLACK][Piece.KING] = np.uint64(0b00010000) << np.uint64(56)
+        self.bitboards[Colour.WHITE][Piece.KING] = 0b00010000
+        self.bitboards[Colour.BLACK][Piece.KING] = 0b00010000 << 56
         
-        
-    def get_occupancy(self) -> np.uint64:
-        return np.bitwise_or.reduce(self.bitboards, axis=None)
+        self.side_to_move = Colour.WHITE
+        self.ep_target = -1
+        self.castling_rights = 0b1111
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        self.history = []
+        self.refresh()
+
+
+    def set_fen(self, fen: str):
+        '''
+            Sets up the position from a FEN. Missing fields after the piece placement take their
+            default values, so the first four fields of an EPD record can be passed in as they are
+        '''
+        fields = fen.split()
+        piece_bitboards = [[0] * len(Piece) for _ in Colour]
+        pieces_by_char = PIECES_BY_CHAR
+
+        # Ranks are listed from 8 to 1
+        square = 56
+        for char in fields[0]:
+            if char == "/":
+                square -= 16
+            elif char.isdigit():
+                square += int(char)
+            else:
+                colour = Colour.WHITE if char.isupper() else Colour.BLACK
+                piece_bitboards[colour][pieces_by_char[char.lower()]] |= 1 << square
+                square += 1
+
+        for colour in Colour:
+            for piece in Piece:
+                self.bitboards[colour][piece] = piece_bitboards[colour][piece]
+
+        self.side_to_move = Colour.WHITE if len(fields) < 2 or fields[1] == "w" else Colour.BLACK
+
+        self.castling_rights = 0
+        if len(fields) > 2:
+            for char in fields[2]:
+                self.castling_rights |= CASTLING_BY_CHAR.get(char, 0)
+
+        self.ep_target = -1
+        if len(fields) > 3 and fields[3] != "-":
+            self.ep_target = (int(fields[3][1]) - 1) * 8 + ord(fields[3][0]) - ord("a")
+
+        self.halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+        self.fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+
+        self.history = []
+        self.refresh()
+
+
+    def to_fen(self) -> str:
+        '''
+            The position as a FEN, read from the mailbox
+        '''
+        mailbox = self.mailbox
+        ranks = []
+        for rank in range(7, -1, -1):
+            rank_string = ""
+            empty = 0
+            for square in range(rank * 8, rank * 8 + 8):
+                code = mailbox[square]
+                if code == EMPTY_SQUARE:
+                    empty += 1
+                    continue
+                if empty:
+                    rank_string += str(empty)
+                    empty = 0
+                char = PIECES[code & 0b111].to_char()
+                rank_string += char.upper() if code >> 3 == Colour.WHITE else char
+            if empty:
+                rank_string += str(empty)
+            ranks.append(rank_string)
+
+        castling = "".join(char for char, right in CASTLING_BY_CHAR.items() if self.castling_rights & right) or "-"
+        if self.ep_target == -1:
+            ep = "-"
+        else:
+            ep = "abcdefgh"[self.ep_target % 8] + str(self.ep_target // 8 + 1)
+
+        return f"{'/'.join(ranks)} {self.side_to_move.to_char()} {castling} {ep} {self.halfmove_clock} {self.fullmove_number}"
+
+
+    def refresh(self):
+        '''
+            Recomputes everything derived from the bitboards from scratch. Called after the position is
+            set up by assigning bitboards directly, rather than through make_move
+        '''
+        self.mailbox[:] = self._compute_mailbox()
+        self.colour_occupancy = self._compute_colour_occupancy()
+        self.occupancy = self.colour_occupancy[Colour.WHITE] | self.colour_occupancy[Colour.BLACK]
+        self.zobrist_key = compute_hash(self)
+        self.pawn_key = compute_pawn_hash(self)
+        self.mg_score, self.eg_score, self.phase = compute_scores(self)
+
+
+    def _compute_mailbox(self) -> bytearray:
+        mailbox = bytearray([EMPTY_SQUARE] * 64)
+        for colour in Colour:
+            for piece in Piece:
+                bitboard = int(self.bitboards[colour][piece])
+                while bitboard:
+                    square = (bitboard & -bitboard).bit_length() - 1
+                    bitboard &= bitboard - 1
+                    mailbox[square] = (colour << 3) | piece
+
+        return mailbox
+
+
+    def _compute_colour_occupancy(self) -> list[int]:
+        colour_occupancy = [0, 0]
+        for colour in Colour:
+            for piece in Piece:
+                colour_occupancy[colour] |= int(self.bitboards[colour][piece])
+
+        return colour_occupancy
+
+
+    def validate(self):
+        '''
+            Asserts that the mailbox, occupancy, zobrist keys and scores agree with the bitboards
+        '''
+        colour_occupancy = self._compute_colour_occupancy()
+        assert self.colour_occupancy == colour_occupancy, "colour occupancy out of sync"
+        assert self.occupancy == colour_occupancy[Colour.WHITE] | colour_occupancy[Colour.BLACK], "occupancy out of sync"
+        assert self.mailbox == self._compute_mailbox(), "mailbox out of sync"
+        assert self.zobrist_key == compute_hash(self), "zobrist key out of sync"
+        assert self.pawn_key == compute_pawn_hash(self), "pawn key out of sync"
+        assert (self.mg_score, self.eg_score, self.phase) == compute_scores(self), "scores out of sync"
+
+
+    @classmethod
+    def from_fen(cls, fen: str) -> "Board":
+        board = cls()
+        board.set_fen(fen)
+
+        return board
+
+
+    def get_occupancy(self) -> int:
+        return self.occupancy
     
     
-    def get_colour_occupancy(self, colour: Colour) -> np.uint64:
-        return np.bitwise_or.reduce(self.bitboards[colour], axis=None)
+    def get_colour_occupancy(self, colour: Colour) -> int:
+        return self.colour_occupancy[colour]
     
     
     def is_slider(self, index: int, colour: Colour) -> bool:
-        return ((self.bitboards[colour][Piece.BISHOP] >> index) & 1) or ((self.bitboards[colour][Piece.ROOK] >> index) & 1) or ((self.bitboards[colour][Piece.QUEEN] >> index) & 1)
+        code = self.mailbox[index]
+        return code >> 3 == colour and Piece.BISHOP <= code & 0b111 <= Piece.QUEEN
     
     
     def get_piece_at(self, index: int, colour: Colour | None = None) -> Piece | None:
-        if colour:
-            for piece in Piece:
-                if self.bitboards[colour][piece] & (1 << index):
-                    return piece
-        else:
-            for colour in Colour:
-                for piece in Piece:
-                    if self.bitboards[colour][piece] & (1 << index):
-                        return piece
+        code = self.mailbox[index]
+        if code == EMPTY_SQUARE or (colour is not None and code >> 3 != colour):
+            return None
         
-        return None
+        return PIECES[code & 0b111]
+    
+    
+    def get_colour_at(self, index: int) -> Colour | None:
+        code = self.mailbox[index]
+        if code == EMPTY_SQUARE:
+            return None
         
-    def make_move(self, source: int, dest: int) -> None:
-        moved_piece_type = None
-        moved_piece_colour = None
-        found = False
+        return COLOURS[code >> 3]
+    
+    
+    def make_move(self, move: int) -> None:
+        '''
+            Plays a 16 bit encoded move for the side to move. The move is trusted to be legal, and its
+            flags decide how castling, en passant and promotion are played out.
+        '''
+        source = decode_source(move)
+        dest = decode_target(move)
+        flag = decode_flag(move)
+        colour = self.side_to_move
+        opponent_colour = colour.opposite
+        
+        mailbox = self.mailbox
+        moved_piece = mailbox[source] & 0b111
+        captured_piece = None
+        captured_square = dest
+        if flag == MoveFlags.EP_CAPTURE:
+            # For en passant, the captured pawn is behind the target square
+            captured_piece = Piece.PAWN
+            captured_square = dest - 8 if colour == Colour.WHITE else dest + 8
+            mailbox[captured_square] = EMPTY_SQUARE
+        elif flag & MoveFlags.CAPTURE:
+            captured_piece = mailbox[dest] & 0b111
+        
+        self.history.append((move, moved_piece, captured_piece, self.castling_rights, self.ep_target, self.zobrist_key,
+                             self.mg_score, self.eg_score, self.phase, self.pawn_key, self.halfmove_clock))
+        
+        # The old castling rights and ep square are xored out here, and the new ones back in at the end
+        key = self.zobrist_key ^ SIDE_KEY ^ CASTLING_KEYS[self.castling_rights]
+        if self.ep_target != -1:
+            key ^= EP_KEYS[self.ep_target % 8]
+        
+        # Capturing opponent pieces. Black's score tables are negative, so removing any piece subtracts
+        # its table value and adding one adds it, whatever its colour
+        colour_occupancy = self.colour_occupancy
+        mg_table = MG_TABLE
+        eg_table = EG_TABLE
+        if captured_piece is not None:
+            self.bitboards[opponent_colour][captured_piece] ^= 1 << captured_square
+            key ^= PIECE_KEYS[opponent_colour][captured_piece][captured_square]
+            if captured_piece == Piece.PAWN:
+                self.pawn_key ^= PIECE_KEYS[opponent_colour][Piece.PAWN][captured_square]
+            colour_occupancy[opponent_colour] ^= 1 << captured_square
+            self.mg_score -= mg_table[opponent_colour][captured_piece][captured_square]
+            self.eg_score -= eg_table[opponent_colour][captured_piece][captured_square]
+            self.phase -= PHASE_WEIGHTS[captured_piece]
+        
+        # Moving the piece. Promotion flags encode the new piece in their lowest two bits
+        if flag & MoveFlags.KNIGHT_PROMOTION:
+            promoted_piece = Piece.KNIGHT + (flag & 0b11)
+            self.bitboards[colour][Piece.PAWN] ^= 1 << source
+            self.bitboards[colour][promoted_piece] ^= 1 << dest
+            key ^= PIECE_KEYS[colour][Piece.PAWN][source] ^ PIECE_KEYS[colour][promoted_piece][dest]
+            self.pawn_key ^= PIECE_KEYS[colour][Piece.PAWN][source]
+            mailbox[dest] = (colour << 3) | promoted_piece
+            self.mg_score += mg_table[colour][promoted_piece][dest] - mg_table[colour][Piece.PAWN][source]
+            self.eg_score += eg_table[colour][promoted_piece][dest] - eg_table[colour][Piece.PAWN][source]
+            self.phase += PHASE_WEIGHTS[promoted_piece]
+        else:
+            self.bitboards[colour][moved_piece] ^= (1 << source) | (1 << dest)
+            key ^= PIECE_KEYS[colour][moved_piece][source] ^ PIECE_KEYS[colour][moved_piece][dest]
+            if moved_piece == Piece.PAWN:
+                self.pawn_key ^= PIECE_KEYS[colour][Piece.PAWN][source] ^ PIECE_KEYS[colour][Piece.PAWN][dest]
+            mailbox[dest] = mailbox[source]
+            self.mg_score += mg_table[colour][moved_piece][dest] - mg_table[colour][moved_piece][source]
+            self.eg_score += eg_table[colour][moved_piece][dest] - eg_table[colour][moved_piece][source]
+        mailbox[source] = EMPTY_SQUARE
+        colour_occupancy[colour] ^= (1 << source) | (1 << dest)
+        
+        # If move is a castle, we move the rook too
+        if flag == MoveFlags.KING_CASTLE:
+            self.bitboards[colour][Piece.ROOK] ^= (1 << (dest + 1)) | (1 << (dest - 1))
+            key ^= PIECE_KEYS[colour][Piece.ROOK][dest + 1] ^ PIECE_KEYS[colour][Piece.ROOK][dest - 1]
+            mailbox[dest - 1] = mailbox[dest + 1]
+            mailbox[dest + 1] = EMPTY_SQUARE
+            colour_occupancy[colour] ^= (1 << (dest + 1)) | (1 << (dest - 1))
+            self.mg_score += mg_table[colour][Piece.ROOK][dest - 1] - mg_table[colour][Piece.ROOK][dest + 1]
+            self.eg_score += eg_table[colour][Piece.ROOK][dest - 1] - eg_table[colour][Piece.ROOK][dest + 1]
+        elif flag == MoveFlags.QUEEN_CASTLE:
+            self.bitboards[colour][Piece.ROOK] ^= (1 << (dest - 2)) | (1 << (dest + 1))
+            key ^= PIECE_KEYS[colour][Piece.ROOK][dest - 2] ^ PIECE_KEYS[colour][Piece.ROOK][dest + 1]
+            mailbox[dest + 1] = mailbox[dest - 2]
+            mailbox[dest - 2] = EMPTY_SQUARE
+            colour_occupancy[colour] ^= (1 << (dest - 2)) | (1 << (dest + 1))
+            self.mg_score += mg_table[colour][Piece.ROOK][dest + 1] - mg_table[colour][Piece.ROOK][dest - 2]
+            self.eg_score += eg_table[colour][Piece.ROOK][dest + 1] - eg_table[colour][Piece.ROOK][dest - 2]
         
-        # Finding piece and colour of source square
-        for colour in Colour:
-            for piece in Piece:
-                if (self.bitboards[colour][piece] >> np.uint64(source)) & np.uint64(1):
-                    found = True
-                    moved_piece_type = piece
-                    moved_piece_colour = colour
-                    break
-            if found:
-                break
-            
-        if found is None or moved_piece_type is None or moved_piece_colour is None:
-            return
-        
-        move_generator = MoveGenerator()
-        legal_moves = move_generator.get_pseudo_legal_moves(self, moved_piece_type, moved_piece_colour, source)
-        if not (legal_moves & (np.uint64(1) << dest)):
-            return
-        
-        # Checking capture of own pieces
-        for piece in Piece:
-            if (self.bitboards[moved_piece_colour][piece] >> np.uint64(dest)) & np.uint64(1):
-                return
-        
-        # Capturing opponent pieces
-        opponent_colour = Colour.WHITE if moved_piece_colour == Colour.BLACK else Colour.BLACK
-        for piece in Piece:
-            if (self.bitboards[opponent_colour][piece] >> np.uint64(dest)) & np.uint64(1):
-                self.bitboards[opponent_colour][piece] ^= (np.uint64(1) << np.uint64(dest))
-                
-        # Taking en passant
-        if moved_piece_type == Piece.PAWN and dest == self.ep_target:
-            opposite_pawn_index = self.ep_target - 8 if moved_piece_colour == Colour.WHITE else self.ep_target + 8
-            self.bitboards[opponent_colour][Piece.PAWN] ^= np.uint64(1) << opposite_pawn_index
-
         # Maintaing en passant data
-        self.ep_target = -1
-        if moved_piece_type == Piece.PAWN and moved_piece_colour == Colour.WHITE and dest - source == 16:
-            self.ep_target = source + 8
-        elif moved_piece_type == Piece.PAWN and moved_piece_colour == Colour.BLACK and source - dest == 16:
-            self.ep_target = source - 8
+        if flag == MoveFlags.DBL_PAWN_PUSH:
+            self.ep_target = (source + dest) // 2
+            key ^= EP_KEYS[self.ep_target % 8]
+        else:
+            self.ep_target = -1
         
         # Updates castling rights. Checking source handles movements of king/rook, and checking dest
         # handles capture of rooks
-        self.castling_rights &= self.castling_masks[source] & self.castling_masks[dest] 
+        self.castling_rights &= self.castling_masks[source] & self.castling_masks[dest]
         
-        # If move is a castle, we move the rook too
-        if moved_piece_type == Piece.KING and moved_piece_colour == Colour.WHITE:
-            # White king side castle
-            if source == 4 and dest == 6:
-                self.bitboards[moved_piece_colour][Piece.ROOK] ^= (np.uint64(1) << 5) | (np.uint64(1) << 7)
-            # White queen side castle
-            elif source == 4 and dest == 2:
-                self.bitboards[moved_piece_colour][Piece.ROOK] ^= (np.uint64(1) << 3) | np.uint64(1)
-        elif moved_piece_type == Piece.KING and moved_piece_colour == Colour.BLACK:
-            # Black king side castle
-            if source == 60 and dest == 62:
-                self.bitboards[moved_piece_colour][Piece.ROOK] ^= (np.uint64(1) << 61) | (np.uint64(1) << 63)
-            # Black queen side castle
-            elif source == 60 and dest == 58:
-                self.bitboards[moved_piece_colour][Piece.ROOK] ^= (np.uint64(1) << 59) | (np.uint64(1) << 56)
-        
-        
-        # Promotion of a pawn. We autoqueen for now
-        if moved_piece_type == Piece.PAWN and ((moved_piece_colour == Colour.WHITE and 56 <= dest <= 64) or (moved_piece_colour == Colour.BLACK and 0 <= dest <= 7)):
-            self.bitboards[moved_piece_colour][moved_piece_type] ^= (np.uint64(1)) << np.uint64(source)
-            self.bitboards[moved_piece_colour][Piece.QUEEN] ^= np.uint64(1) << np.uint64(dest)
-        # Moving the piece
+        if moved_piece == Piece.PAWN or captured_piece is not None:
+            self.halfmove_clock = 0
         else:
-            self.bitboards[moved_piece_colour][moved_piece_type] ^= ((np.uint64(1)) << np.uint64(source)) | (np.uint64(1) << np.uint64(dest))
\ No newline at end of file
+            self.halfmove_clock += 1
+        if colour == Colour.BLACK:
+            self.fullmove_number += 1
+        
+        self.side_to_move = opponent_colour
+        self.zobrist_key = key ^ CASTLING_KEYS[self.castling_rights]
+        self.occupancy = colour_occupancy[Colour.WHITE] | colour_occupancy[Colour.BLACK]
+        
+        if self.debug:
+            self.validate()
+        
+        
+    def unmake_move(self) -> None:
+        '''
+            Takes back the last move made, restoring the state saved on the undo stack
+        '''
+        move, moved_piece, captured_piece, castling_rights, ep_target, zobrist_key, mg_score, eg_score, phase, pawn_key, halfmove_clock = self.history.pop()
+        source = decode_source(move)
+        dest = decode_target(move)
+        flag = decode_flag(move)
+        opponent_colour = self.side_to_move
+        colour = opponent_colour.opposite
+        
+        self.side_to_move = colour
+        self.castling_rights = castling_rights
+        self.ep_target = ep_target
+        self.zobrist_key = zobrist_key
+        self.pawn_key = pawn_key
+        self.halfmove_clock = halfmove_clock
+        if colour == Colour.BLACK:
+            self.fullmove_number -= 1
+        self.mg_score = mg_score
+        self.eg_score = eg_score
+        self.phase = phase
+        mailbox = self.mailbox
+        colour_occupancy = self.colour_occupancy
+        
+        if flag == MoveFlags.KING_CASTLE:
+            self.bitboards[colour][Piece.ROOK] ^= (1 << (dest + 1)) | (1 << (dest - 1))
+            mailbox[dest + 1] = mailbox[dest - 1]
+            mailbox[dest - 1] = EMPTY_SQUARE
+            colour_occupancy[colour] ^= (1 << (dest + 1)) | (1 << (dest - 1))
+        elif flag == MoveFlags.QUEEN_CASTLE:
+            self.bitboards[colour][Piece.ROOK] ^= (1 << (dest - 2)) | (1 << (dest + 1))
+            mailbox[dest - 2] = mailbox[dest + 1]
+            mailbox[dest + 1] = EMPTY_SQUARE
+            colour_occupancy[colour] ^= (1 << (dest - 2)) | (1 << (dest + 1))
+        
+        if flag & MoveFlags.KNIGHT_PROMOTION:
+            self.bitboards[colour][Piece.PAWN] ^= 1 << source
+            self.bitboards[colour][Piece.KNIGHT + (flag & 0b11)] ^= 1 << dest
+        else:
+            self.bitboards[colour][moved_piece] ^= (1 << source) | (1 << dest)
+        mailbox[source] = (colour << 3) | moved_piece
+        mailbox[dest] = EMPTY_SQUARE
+        colour_occupancy[colour] ^= (1 << source) | (1 << dest)
+        
+        if flag == MoveFlags.EP_CAPTURE:
+            captured_square = dest - 8 if colour == Colour.WHITE else dest + 8
+            self.bitboards[opponent_colour][Piece.PAWN] ^= 1 << captured_square
+            mailbox[captured_square] = (opponent_colour << 3) | Piece.PAWN
+            colour_occupancy[opponent_colour] ^= 1 << captured_square
+        elif captured_piece is not None:
+            self.bitboards[opponent_colour][captured_piece] ^= 1 << dest
+            mailbox[dest] = (opponent_colour << 3) | captured_piece
+            colour_occupancy[opponent_colour] ^= 1 << dest
+        
+        self.occupancy = colour_occupancy[Colour.WHITE] | colour_occupancy[Colour.BLACK]
+        
+        if self.debug:
+            self.validate()
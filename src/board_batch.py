@@ -0,0 +1,185 @@
+import numpy as np
+from constants import Piece, Colour, Rank, File, Direction
+from move_generator import MoveGenerator, RANK_MASK, FILE_MASK
+from board import Board
+
+'''
+    Struct of arrays layout for running bitboard operations over many independent positions at once.
+    Every function here works on whole (N,) arrays of uint64 bitboards, so numpy does the looping
+    instead of python, which is where it pays for itself over single scalar operations.
+'''
+
+NOT_A_FILE = ~FILE_MASK[File.A]
+NOT_H_FILE = ~FILE_MASK[File.H]
+FULL = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+# (shift, mask applied after shifting to drop squares which wrapped around the board edge).
+# Positive shifts are to the left
+DIRECTION_SHIFTS = {
+    Direction.N: (8, FULL),
+    Direction.NE: (9, NOT_A_FILE),
+    Direction.E: (1, NOT_A_FILE),
+    Direction.SE: (-7, NOT_A_FILE),
+    Direction.S: (-8, FULL),
+    Direction.SW: (-9, NOT_H_FILE),
+    Direction.W: (-1, NOT_H_FILE),
+    Direction.NW: (7, NOT_H_FILE),
+}
+
+SQUARE_BITS = np.uint64(1) << np.arange(64, dtype=np.uint64)
+
+
+class BoardBatch:
+    def __init__(self, size: int):
+        # Same layout as Board.bitboards, with the batch index first
+        self.bitboards = np.zeros((size, 2, 6), dtype=np.uint64)
+        self.side_to_move = np.zeros(size, dtype=np.uint8)
+        self.ep_target = np.full(size, -1, dtype=np.int8)
+        self.castling_rights = np.zeros(size, dtype=np.uint8)
+
+
+    def __len__(self) -> int:
+        return len(self.bitboards)
+
+
+    @classmethod
+    def from_boards(cls, boards: list[Board]) -> "BoardBatch":
+        batch = cls(len(boards))
+        for i, board in enumerate(boards):
+            for colour in Colour:
+                for piece in Piece:
+                    batch.bitboards[i, colour, piece] = int(board.bitboards[colour][piece])
+            batch.side_to_move[i] = board.side_to_move
+            batch.ep_target[i] = board.ep_target
+            batch.castling_rights[i] = board.castling_rights
+
+        return batch
+
+
+    def to_board(self, index: int) -> Board:
+        board = Board()
+        board.bitboards[:] = self.bitboards[index]
+        board.side_to_move = Colour(int(self.side_to_move[index]))
+        board.ep_target = int(self.ep_target[index])
+        board.castling_rights = int(self.castling_rights[index])
+        board.refresh()
+
+        return board
+
+
+    def get_colour_occupancy(self, colour: Colour) -> np.ndarray:
+        return np.bitwise_or.reduce(self.bitboards[:, colour], axis=1)
+
+
+    def get_occupancy(self) -> np.ndarray:
+        return np.bitwise_or.reduce(self.bitboards.reshape(len(self), 12), axis=1)
+
+
+def shift(bitboards: np.ndarray, direction: Direction) -> np.ndarray:
+    amount, mask = DIRECTION_SHIFTS[direction]
+    if amount > 0:
+        return (bitboards << np.uint64(amount)) & mask
+    return (bitboards >> np.uint64(-amount)) & mask
+
+
+def _squares(bitboards: np.ndarray) -> np.ndarray:
+    # (N, 64) boolean array of which squares are set in each bitboard
+    return (bitboards[:, None] & SQUARE_BITS) != 0
+
+
+def _table_attacks(bitboards: np.ndarray, table: np.ndarray) -> np.ndarray:
+    '''
+        Union of table[square] over every set square of each bitboard. The table is fancy indexed
+        against every square at once, and squares which aren't set are masked to 0
+    '''
+    return np.bitwise_or.reduce(np.where(_squares(bitboards), table[None, :], np.uint64(0)), axis=1)
+
+
+def pawn_pushes(batch: BoardBatch, colour: Colour) -> tuple[np.ndarray, np.ndarray]:
+    '''
+        Target squares of single and double pushes for all pawns of a colour
+    '''
+    pawns = batch.bitboards[:, colour, Piece.PAWN]
+    empty = ~batch.get_occupancy()
+    if colour == Colour.WHITE:
+        single = shift(pawns, Direction.N) & empty
+        double = shift(single & RANK_MASK[Rank.THREE], Direction.N) & empty
+    else:
+        single = shift(pawns, Direction.S) & empty
+        double = shift(single & RANK_MASK[Rank.SIX], Direction.S) & empty
+
+    return single, double
+
+
+def pawn_attacks(pawns: np.ndarray, colour: Colour) -> np.ndarray:
+    if colour == Colour.WHITE:
+        return shift(pawns, Direction.NE) | shift(pawns, Direction.NW)
+    return shift(pawns, Direction.SE) | shift(pawns, Direction.SW)
+
+
+def pawn_captures(batch: BoardBatch, colour: Colour) -> tuple[np.ndarray, np.ndarray]:
+    '''
+        Target squares of captures towards the east and west for all pawns of a colour, including
+        en passant captures on the boards where that colour is to move
+    '''
+    pawns = batch.bitboards[:, colour, Piece.PAWN]
+    targets = batch.get_colour_occupancy(colour.opposite)
+    # The en passant square is only a target for the side to move, not the side which just double pushed
+    has_ep = (batch.ep_target >= 0) & (batch.side_to_move == colour)
+    targets[has_ep] |= SQUARE_BITS[batch.ep_target[has_ep]]
+
+    if colour == Colour.WHITE:
+        return shift(pawns, Direction.NE) & targets, shift(pawns, Direction.NW) & targets
+    return shift(pawns, Direction.SE) & targets, shift(pawns, Direction.SW) & targets
+
+
+def knight_attacks(batch: BoardBatch, colour: Colour, move_generator: MoveGenerator) -> np.ndarray:
+    return _table_attacks(batch.bitboards[:, colour, Piece.KNIGHT], move_generator.knight_moves)
+
+
+def king_attacks(batch: BoardBatch, colour: Colour, move_generator: MoveGenerator) -> np.ndarray:
+    return _table_attacks(batch.bitboards[:, colour, Piece.KING], move_generator.king_moves)
+
+
+def sliding_attacks(sliders: np.ndarray, occupancy: np.ndarray, directions: list[Direction]) -> np.ndarray:
+    '''
+        Each ray is filled one square at a time for all boards, stopping at the first blocker,
+        which is included as it may be a capture
+    '''
+    empty = ~occupancy
+    attacks = np.zeros_like(sliders)
+    for direction in directions:
+        ray = sliders
+        for _ in range(7):
+            ray = shift(ray, direction)
+            attacks |= ray
+            ray = ray & empty
+
+    return attacks
+
+
+def attacked_squares(batch: BoardBatch, colour: Colour, move_generator: MoveGenerator) -> np.ndarray:
+    '''
+        Bitboard of every square attacked by colour, for all boards
+    '''
+    bitboards = batch.bitboards[:, colour]
+    occupancy = batch.get_occupancy()
+    queens = bitboards[:, Piece.QUEEN]
+
+    attacks = pawn_attacks(bitboards[:, Piece.PAWN], colour)
+    attacks |= knight_attacks(batch, colour, move_generator)
+    attacks |= king_attacks(batch, colour, move_generator)
+    attacks |= sliding_attacks(bitboards[:, Piece.BISHOP] | queens, occupancy, [Direction.NE, Direction.SE, Direction.SW, Direction.NW])
+    attacks |= sliding_attacks(bitboards[:, Piece.ROOK] | queens, occupancy, [Direction.N, Direction.E, Direction.S, Direction.W])
+
+    return attacks
+
+
+def in_check(batch: BoardBatch, move_generator: MoveGenerator) -> np.ndarray:
+    '''
+        Whether the side to move is in check, for all boards
+    '''
+    white_checked = (attacked_squares(batch, Colour.BLACK, move_generator) & batch.bitboards[:, Colour.WHITE, Piece.KING]) != 0
+    black_checked = (attacked_squares(batch, Colour.WHITE, move_generator) & batch.bitboards[:, Colour.BLACK, Piece.KING]) != 0
+
+    return np.where(batch.side_to_move == Colour.WHITE, white_checked, black_checked)
@@ -4,6 +4,13 @@ GAME_WIDTH = 640
 GAME_HEIGHT = 640
 GAME_SQUARE_SIZE = GAME_WIDTH // 8
 
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# No position has more than 218 legal moves, so this is enough room for the moves of one ply
+MAX_MOVES = 256
+# Deepest ply a search can reach, which sizes the per ply move buffers
+MAX_PLY = 128
+
 class Piece(IntEnum):
     PAWN = 0
     KNIGHT = 1
@@ -123,4 +130,17 @@ class MoveFlags(IntEnum):
     KNIGHT_PROMOTION_CAPTURE = 12
     BISHOP_PROMOTION_CAPTURE = 13
     ROOK_PROMOTION_CAPTURE = 14
-    QUEEN_PROMOTION_CAPTURE = 15
\ No newline at end of file
+    QUEEN_PROMOTION_CAPTURE = 15
+
+class GenType(IntEnum):
+    ALL = 0
+    # Captures, en passant and every promotion
+    NOISY = 1
+    # Every other move, including castling
+    QUIET = 2
+
+class Bound(IntEnum):
+    # Zero is left for empty transposition table entries
+    EXACT = 1
+    LOWER = 2
+    UPPER = 3
@@ -0,0 +1,154 @@
+import argparse
+import mmap
+import time
+from typing import Iterator
+from board import Board
+from int_board import IntBoard
+
+'''
+    EPD records are the first four fields of a FEN, followed by operations, each an opcode and its
+    operands ended by a semicolon, e.g.
+    r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - bm Bb5; id "ruy lopez";
+
+    Files are read a line at a time, so any number of records can be streamed through in constant
+    memory, and only the records actually used are turned into boards.
+'''
+
+
+class EpdRecord:
+    __slots__ = ("fen", "operations")
+
+    def __init__(self, fen: str, operations: dict[str, list[str]]):
+        # The four position fields, with the clocks from the hmvc and fmvn operations added when present
+        self.fen = fen
+        # Operands of each opcode, with the quotes taken off quoted strings
+        self.operations = operations
+
+
+    @property
+    def id(self) -> str | None:
+        operands = self.operations.get("id")
+        return operands[0] if operands else None
+
+
+    @property
+    def best_moves(self) -> list[str]:
+        '''
+            Best moves, in SAN
+        '''
+        return self.operations.get("bm", [])
+
+
+    @property
+    def avoid_moves(self) -> list[str]:
+        return self.operations.get("am", [])
+
+
+    def to_board(self, board_type: type[Board] = IntBoard) -> Board:
+        return board_type.from_fen(self.fen)
+
+
+def _split_operations(text: str) -> dict[str, list[str]]:
+    '''
+        Splits the operations of a record into opcodes and operands. Semicolons and spaces inside
+        quoted strings don't end an operand
+    '''
+    operations = {}
+    tokens = []
+    token = ""
+    quoted = False
+    in_token = False
+    for char in text:
+        if quoted:
+            if char == '"':
+                quoted = False
+            else:
+                token += char
+        elif char == '"':
+            quoted = True
+            in_token = True
+        elif char == ";" or char.isspace():
+            if in_token:
+                tokens.append(token)
+                token = ""
+                in_token = False
+            if char == ";" and tokens:
+                operations[tokens[0]] = tokens[1:]
+                tokens = []
+        else:
+            token += char
+            in_token = True
+
+    # The last operation is allowed to be missing its semicolon
+    if in_token:
+        tokens.append(token)
+    if tokens:
+        operations[tokens[0]] = tokens[1:]
+
+    return operations
+
+
+def parse_epd(line: str) -> EpdRecord:
+    fields = line.split(maxsplit=4)
+    if len(fields) < 4:
+        raise ValueError(f"EPD record needs at least four fields: {line!r}")
+
+    operations = _split_operations(fields[4]) if len(fields) > 4 else {}
+    fen = " ".join(fields[:4])
+    if "hmvc" in operations or "fmvn" in operations:
+        fen += f" {operations.get('hmvc', ['0'])[0]} {operations.get('fmvn', ['1'])[0]}"
+
+    return EpdRecord(fen, operations)
+
+
+def _read_lines(path: str, use_mmap: bool) -> Iterator[bytes]:
+    with open(path, "rb") as file:
+        # mmap can't map an empty file
+        if use_mmap and file.seek(0, 2) > 0:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                yield from iter(mapped.readline, b"")
+        else:
+            file.seek(0)
+            yield from file
+
+
+def read_epd(path: str, use_mmap: bool = False) -> Iterator[EpdRecord]:
+    '''
+        Yields the records of an EPD file one at a time. Blank lines and lines starting with # are
+        skipped. With use_mmap, the file is read through a memory map instead of buffered reads,
+        which lets the OS page cache be shared between processes reading the same file
+    '''
+    for line in _read_lines(path, use_mmap):
+        line = line.strip()
+        if not line or line.startswith(b"#"):
+            continue
+        yield parse_epd(line.decode())
+
+
+def read_boards(path: str, board_type: type[Board] = IntBoard, use_mmap: bool = False) -> Iterator[tuple[Board, EpdRecord]]:
+    '''
+        Yields each record of an EPD file along with its position set up on a board. The same board
+        is set up again for every record, so it must be copied if it is kept past the next one
+    '''
+    board = board_type()
+    for record in read_epd(path, use_mmap):
+        board.set_fen(record.fen)
+        yield board, record
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load every position of an EPD file and report how fast they were read")
+    parser.add_argument("path")
+    parser.add_argument("--mmap", action="store_true", help="Read the file through a memory map")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    count = 0
+    for _ in read_boards(args.path, use_mmap=args.mmap):
+        count += 1
+    elapsed = time.perf_counter() - start
+    print(f"Loaded {count} positions in {elapsed:.3f}s, {int(count / max(elapsed, 1e-9))} positions/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+from constants import Piece, Colour
+from pawn_structure import PawnHashTable, evaluate_pawns, king_shield
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from board import Board
+
+'''
+    Scores are in centipawns, from the point of view of the side to move, as negamax expects.
+
+    Every piece is worth its material plus a piece-square bonus, with separate values for the
+    middlegame and the endgame. The board keeps the sum of both over all its pieces, from white's
+    point of view, and updates them in make_move, so evaluating a position is just blending the two
+    by how much material is left, known as the game phase.
+
+    Pawn structure and king shelter scores are added to both before they are blended. The pawn
+    structure comes from a pawn hash table when one is given.
+'''
+
+MG_PIECE_VALUES = [82, 337, 365, 477, 1025, 0]
+EG_PIECE_VALUES = [94, 281, 297, 512, 936, 0]
+
+# Contribution of each piece to the game phase. The phase is TOTAL_PHASE with all the pieces on
+# the board, and 0 with only kings and pawns
+PHASE_WEIGHTS = [0, 1, 1, 2, 4, 0]
+TOTAL_PHASE = 24
+
+# Piece-square tables from white's point of view, laid out as the board is seen, so the first row
+# is rank 8 and the last is rank 1
+MG_PAWN = [
+      0,   0,   0,   0,   0,   0,   0,   0,
+     50,  50,  50,  50,  50,  50,  50,  50,
+     10,  10,  20,  30,  30,  20,  10,  10,
+      5,   5,  10,  25,  25,  10,   5,   5,
+      0,   0,   0,  20,  20,   0,   0,   0,
+      5,  -5, -10,   0,   0, -10,  -5,   5,
+      5,  10,  10, -20, -20,  10,  10,   5,
+      0,   0,   0,   0,   0,   0,   0,   0,
+]
+# In the endgame, pawns are worth more the closer they are to promoting
+EG_PAWN = [
+      0,   0,   0,   0,   0,   0,   0,   0,
+     80,  80,  80,  80,  80,  80,  80,  80,
+     50,  50,  50,  50,  50,  50,  50,  50,
+     30,  30,  30,  30,  30,  30,  30,  30,
+     15,  15,  15,  15,  15,  15,  15,  15,
+      5,   5,   5,   5,   5,   5,   5,   5,
+      0,   0,   0,   0,   0,   0,   0,   0,
+      0,   0,   0,   0,   0,   0,   0,   0,
+]
+KNIGHT = [
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20,   0,   0,   0,   0, -20, -40,
+    -30,   0,  10,  15,  15,  10,   0, -30,
+    -30,   5,  15,  20,  20,  15,   5, -30,
+    -30,   0,  15,  20,  20,  15,   0, -30,
+    -30,   5,  10,  15,  15,  10,   5, -30,
+    -40, -20,   0,   5,   5,   0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50,
+]
+BISHOP = [
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,  10,  10,   5,   0, -10,
+    -10,   5,   5,  10,  10,   5,   5, -10,
+    -10,   0,  10,  10,  10,  10,   0, -10,
+    -10,  10,  10,  10,  10,  10,  10, -10,
+    -10,   5,   0,   0,   0,   0,   5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20,
+]
+ROOK = [
+      0,   0,   0,   0,   0,   0,   0,   0,
+      5,  10,  10,  10,  10,  10,  10,   5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+      0,   0,   0,   5,   5,   0,   0,   0,
+]
+QUEEN = [
+    -20, -10, -10,  -5,  -5, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,   5,   5,   5,   0, -10,
+     -5,   0,   5,   5,   5,   5,   0,  -5,
+      0,   0,   5,   5,   5,   5,   0,  -5,
+    -10,   5,   5,   5,   5,   5,   0, -10,
+    -10,   0,   5,   0,   0,   0,   0, -10,
+    -20, -10, -10,  -5,  -5, -10, -10, -20,
+]
+# The king hides behind its pawns in the middlegame, and comes to the centre in the endgame
+MG_KING = [
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+     20,  20,   0,   0,   0,   0,  20,  20,
+     20,  30,  10,   0,   0,  10,  30,  20,
+]
+EG_KING = [
+    -50, -40, -30, -20, -20, -30, -40, -50,
+    -30, -20, -10,   0,   0, -10, -20, -30,
+    -30, -10,  20,  30,  30,  20, -10, -30,
+    -30, -10,  30,  40,  40,  30, -10, -30,
+    -30, -10,  30,  40,  40,  30, -10, -30,
+    -30, -10,  20,  30,  30,  20, -10, -30,
+    -30, -30,   0,   0,   0,   0, -30, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50,
+]
+
+
+def _build_table(piece_values: list[int], piece_square_tables: list[list[int]]) -> list[list[list[int]]]:
+    '''
+        Indexed by [colour][piece][square], with material included and black's values negated, so
+        the incremental update is the same for both colours. White's square is flipped vertically
+        to index the tables, since their first row is rank 8, and black's is used as it is, which
+        mirrors the table for black
+    '''
+    return [
+        [[piece_values[piece] + piece_square_tables[piece][square ^ 56] for square in range(64)] for piece in Piece],
+        [[-(piece_values[piece] + piece_square_tables[piece][square]) for square in range(64)] for piece in Piece],
+    ]
+
+
+MG_TABLE = _build_table(MG_PIECE_VALUES, [MG_PAWN, KNIGHT, BISHOP, ROOK, QUEEN, MG_KING])
+EG_TABLE = _build_table(EG_PIECE_VALUES, [EG_PAWN, KNIGHT, BISHOP, ROOK, QUEEN, EG_KING])
+
+
+def compute_scores(board: "Board") -> tuple[int, int, int]:
+    '''
+        Computes the middlegame score, endgame score and phase of a position from scratch. Used to
+        initialise a board's scores, and to verify the incrementally updated ones
+    '''
+    mg_score = 0
+    eg_score = 0
+    phase = 0
+    for colour in Colour:
+        for piece in Piece:
+            bitboard = int(board.bitboards[colour][piece])
+            while bitboard:
+                square = (bitboard & -bitboard).bit_length() - 1
+                bitboard &= bitboard - 1
+                mg_score += MG_TABLE[colour][piece][square]
+                eg_score += EG_TABLE[colour][piece][square]
+                phase += PHASE_WEIGHTS[piece]
+
+    return mg_score, eg_score, phase
+
+
+def evaluate(board: "Board", pawn_table: PawnHashTable | None = None) -> int:
+    if pawn_table is not None:
+        pawn_mg, pawn_eg, _, _ = pawn_table.probe(board)
+    else:
+        pawn_mg, pawn_eg, _, _ = evaluate_pawns(board)
+    mg_score = board.mg_score + pawn_mg + king_shield(board)
+    eg_score = board.eg_score + pawn_eg
+
+    # Promotions can take the phase above its starting value
+    phase = min(board.phase, TOTAL_PHASE)
+    score = mg_score * phase + eg_score * (TOTAL_PHASE - phase)
+
+    # Flipped before dividing, so mirrored positions round the same way for the side to move
+    return (score if board.side_to_move == Colour.WHITE else -score) // TOTAL_PHASE
+
+
+def evaluate_from_scratch(board: "Board") -> int:
+    '''
+        evaluate, without relying on the board's incrementally updated scores
+    '''
+    mg_score, eg_score, phase = compute_scores(board)
+    pawn_mg, pawn_eg, _, _ = evaluate_pawns(board)
+    mg_score += pawn_mg + king_shield(board)
+    eg_score += pawn_eg
+    phase = min(phase, TOTAL_PHASE)
+    score = mg_score * phase + eg_score * (TOTAL_PHASE - phase)
+
+    return (score if board.side_to_move == Colour.WHITE else -score) // TOTAL_PHASE
@@ -0,0 +1,45 @@
+from constants import Piece, Colour
+from board import Board
+
+class IntBoard(Board):
+    '''
+        Board which stores its twelve bitboards as plain python ints instead of a numpy array.
+        Bit operations on single np.uint64 values pay for scalar boxing and dtype promotion,
+        which costs far more than the bit math itself, so this is the representation to run
+        the move generator against when speed matters.
+    '''
+    __slots__ = ()
+
+    def _empty_bitboards(self):
+        return [[0] * len(Piece) for _ in Colour]
+
+
+    @classmethod
+    def from_board(cls, board: Board) -> "IntBoard":
+        int_board = cls()
+        int_board.bitboards = [[int(board.bitboards[colour][piece]) for piece in Piece] for colour in Colour]
+        int_board.side_to_move = board.side_to_move
+        int_board.ep_target = board.ep_target
+        int_board.castling_rights = board.castling_rights
+        int_board.halfmove_clock = board.halfmove_clock
+        int_board.fullmove_number = board.fullmove_number
+        int_board.history = list(board.history)
+        int_board.refresh()
+
+        return int_board
+
+
+    def to_board(self) -> Board:
+        board = Board()
+        for colour in Colour:
+            for piece in Piece:
+                board.bitboards[colour][piece] = self.bitboards[colour][piece]
+        board.side_to_move = self.side_to_move
+        board.ep_target = self.ep_target
+        board.castling_rights = self.castling_rights
+        board.halfmove_clock = self.halfmove_clock
+        board.fullmove_number = self.fullmove_number
+        board.history = list(self.history)
+        board.refresh()
+
+        return board
@@ -0,0 +1,44 @@
+'''
+    Magic multipliers for the sliding piece attack tables, one per square.
+    For a square, (occupancy & mask) * magic >> (64 - mask bits) is a perfect hash
+    of every blocker configuration in the mask, so it can be used to index a table of
+    precomputed attack sets. Found with a seeded random search over sparse 64 bit numbers.
+'''
+
+ROOK_MAGICS = [
+    0x6080008010400024, 0x0040004010002000, 0x0480100082200108, 0x2080080010000480,
+    0x0E00044200082010, 0x1900080400410002, 0x0400021120900C08, 0x0080102880014500,
+    0x0010800080400020, 0x2000402000401000, 0x088280100080A005, 0x1082001200440820,
+    0x4805001048030004, 0x2802800201800400, 0x0028800100800200, 0x3006000240810E04,
+    0x0000208000804000, 0x3000818040006000, 0x0040808020001000, 0x0200828008001000,
+    0x1004008080040800, 0x8012008080040002, 0x0004040081100802, 0x0800020000840061,
+    0x1100800080204000, 0x0400400280200081, 0x0000200080801000, 0x8E80080080100080,
+    0x4004008180042801, 0x1004004040020100, 0x0022000200444108, 0x0208408200004104,
+    0x8040400022800080, 0x0900802000804000, 0x2000801000802004, 0x0000801000800800,
+    0x0800080080800400, 0x0002040080800200, 0x9401000401000200, 0x04D9090446000084,
+    0x40E0224000828000, 0x1301004000850020, 0x0890200041010010, 0x0A10201001010008,
+    0x8604008008008004, 0x0241000804010002, 0x0413010002008080, 0x3000008400420001,
+    0x20C0002A50800080, 0x0000200040048880, 0x1020004010080040, 0x0018100100200900,
+    0x4018000882040080, 0x0040800400020080, 0x0208028108100400, 0x065020844C010200,
+    0x0000800028550041, 0x2002204A10820102, 0x0000420900200033, 0x000A042009011001,
+    0x4002000411200802, 0x8109000400020801, 0x0080024810012084, 0x4238010EA08C0042,
+]
+
+BISHOP_MAGICS = [
+    0x0040320809202680, 0x10040808010C2000, 0x048404440448008A, 0x000A1A020080D210,
+    0x0101104001000010, 0x0101042004040200, 0x4080441A38C02819, 0x8180104410041000,
+    0x2000041002880100, 0x0600204109060480, 0x2800100080950000, 0x880804440482C000,
+    0x0000020210040000, 0x0000020203208000, 0x4801008C10021138, 0x0188411048140400,
+    0x0004101120880124, 0x0420003101120084, 0x0002000420220200, 0x4004000802182042,
+    0x0004000211040004, 0x0109000202821104, 0x1029200400821008, 0xA00482002C090800,
+    0x0004220004489000, 0x8790080002821424, 0x0200222224080200, 0x0004080092202040,
+    0x8101004134004040, 0x0408910042806000, 0x0082004012015001, 0x43108A8022084420,
+    0x0002200404101138, 0x9044A848420C5000, 0x8041080100080040, 0x2408400820820200,
+    0x1204200200002080, 0x1810050110020240, 0x8802080068020206, 0x00020200204200A5,
+    0x0002014420004010, 0x0801080802020400, 0x01010C0044000800, 0x2381010411080800,
+    0x0800040094000200, 0x0301020082042900, 0xC004013802010101, 0x0A81082200502481,
+    0x0C01042202400080, 0x0204289210100040, 0x0400011080902400, 0x4000200084040568,
+    0x000050C015090000, 0x90020A2058008220, 0x8840181145020008, 0x0010302210444012,
+    0x00A0124202104050, 0x0804084844500802, 0x00000102C2029084, 0x015000004A421208,
+    0x0008000404104400, 0x0049008910304086, 0x1000206821810404, 0x0094182088018100,
+]
@@ -35,4 +35,20 @@ def decode_target(move_int: np.int16):
 
 
 def decode_flag(move_int: np.int16):
-    return (move_int >> 12) & 0xF
\ No newline at end of file
+    return (move_int >> 12) & 0xF
+
+
+def square_to_string(square: int) -> str:
+    return "abcdefgh"[square % 8] + str(square // 8 + 1)
+
+
+def move_to_string(move_int: int) -> str:
+    '''
+        Long algebraic notation, as used by UCI, e.g. e2e4 or e7e8q
+    '''
+    move_string = square_to_string(decode_source(move_int)) + square_to_string(decode_target(move_int))
+    flag = decode_flag(move_int)
+    if flag & 0b1000:
+        move_string += "nbrq"[flag & 0b11]
+        
+    return move_string
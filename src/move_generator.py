@@ -1,8 +1,11 @@
+import os
 import numpy as np
-from constants import Colour, Piece, Rank, File, Direction, Castling, MoveFlags
+from array import array
+from constants import Colour, Piece, Rank, File, Direction, Castling, MoveFlags, GenType, MAX_MOVES
 from bitboard_helper import get_lsb_index, get_msb_index
 from typing import TYPE_CHECKING
-from move import encode_move
+from move import encode_move, decode_source
+from magics import ROOK_MAGICS, BISHOP_MAGICS
 
 if TYPE_CHECKING:
     from board import Board
@@ -26,8 +29,194 @@ FILE_MASK = np.array(
     dtype=np.uint64
 )
 
+FULL_BITBOARD = 0xFFFFFFFFFFFFFFFF
+RANK_2 = int(RANK_MASK[Rank.TWO])
+RANK_3 = int(RANK_MASK[Rank.THREE])
+RANK_6 = int(RANK_MASK[Rank.SIX])
+RANK_7 = int(RANK_MASK[Rank.SEVEN])
+NOT_A_FILE = FULL_BITBOARD ^ int(FILE_MASK[File.A])
+NOT_H_FILE = FULL_BITBOARD ^ int(FILE_MASK[File.H])
+PROMOTION_RANKS = int(RANK_MASK[Rank.ONE] | RANK_MASK[Rank.EIGHT])
+PROMOTION_FLAGS = [MoveFlags.KNIGHT_PROMOTION, MoveFlags.BISHOP_PROMOTION, MoveFlags.ROOK_PROMOTION, MoveFlags.QUEEN_PROMOTION]
+
+BISHOP_DIRS = [Direction.NE, Direction.SE, Direction.SW, Direction.NW]
+ROOK_DIRS = [Direction.N, Direction.S, Direction.W, Direction.E]
+POS_DIR = [Direction.NW, Direction.N, Direction.NE, Direction.E]
+
+# The precomputed tables only depend on the board geometry, so they are built once per process
+# and shared by every MoveGenerator
+_tables = None
+# The arrays the tables were prepared from, kept so a cache file can be written for any path given later
+_table_arrays = None
+# Table cache paths already loaded or written by this process, which needn't be checked again
+_checked_caches = set()
+
+# Version of the table cache file layout. Bump it whenever the layout, or anything the tables are
+# built from such as the magic numbers, changes, so that stale cache files are rebuilt
+TABLES_VERSION = 1
+# Arrays stored in the table cache file, in order, after the version. The flattened magic attack
+# tables follow them, with lengths given by the last entry of their offsets
+TABLE_LAYOUT = [
+    ("knight_moves", (64,)),
+    ("king_moves", (64,)),
+    ("pawn_attacks", (2, 64)),
+    ("rays", (64, 8)),
+    ("between", (64, 64)),
+    ("bishop_masks", (64,)),
+    ("bishop_shifts", (64,)),
+    ("bishop_offsets", (65,)),
+    ("rook_masks", (64,)),
+    ("rook_shifts", (64,)),
+    ("rook_offsets", (65,)),
+]
+
+
+def _load_table_cache(path: str) -> dict[str, np.ndarray] | None:
+    '''
+        Memory maps the tables from a cache file, so processes loading the same file share its pages.
+        Returns None if the file is missing, or isn't for the current TABLES_VERSION
+    '''
+    try:
+        data = np.load(path, mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+    if data.dtype != np.uint64 or data.ndim != 1 or len(data) == 0 or data[0] != TABLES_VERSION:
+        return None
+    
+    arrays = {}
+    position = 1
+    for name, shape in TABLE_LAYOUT:
+        size = int(np.prod(shape))
+        arrays[name] = data[position:position + size].reshape(shape)
+        position += size
+    for slider in ("bishop", "rook"):
+        size = int(arrays[f"{slider}_offsets"][-1])
+        arrays[f"{slider}_table"] = data[position:position + size]
+        position += size
+    
+    if position != len(data):
+        return None
+    return arrays
+
+
+def _save_table_cache(path: str, arrays: dict[str, np.ndarray]) -> bool:
+    '''
+        Writes the tables to a cache file. The cache is only an optimisation, so a file which can't be
+        written is skipped rather than raised. Returns whether the file was written
+    '''
+    parts = [np.array([TABLES_VERSION], dtype=np.uint64)]
+    parts += [arrays[name].ravel() for name, _ in TABLE_LAYOUT]
+    parts += [arrays["bishop_table"], arrays["rook_table"]]
+    
+    # Written to a temporary file first, so other processes never load a partly written cache
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "wb") as file:
+            np.save(file, np.concatenate(parts).astype(np.uint64))
+        os.replace(temp_path, path)
+    except OSError:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        return False
+    return True
+
+
+def _int_view(array: np.ndarray) -> memoryview:
+    '''
+        A flat view of a uint64 array. Indexing a memoryview gives python ints, as indexing a list does,
+        but reads straight from the array's memory, so memory mapped tables stay shared between processes
+        rather than being copied into every one of them
+    '''
+    return memoryview(np.ascontiguousarray(array, dtype=np.uint64)).cast('B').cast('Q')
+
+
+def _int_rows(array: np.ndarray) -> list[memoryview]:
+    # One view per row of a 2D array, sliced out of the flat view without copying
+    view = _int_view(array)
+    width = array.shape[1]
+    return [view[row * width:(row + 1) * width] for row in range(array.shape[0])]
+
+
+def _prepare_tables(arrays: dict[str, np.ndarray]) -> dict:
+    '''
+        The attributes every MoveGenerator shares. The numpy tables are kept for vectorised use, and
+        the ones used during generation are also exposed as memoryviews of the same memory, since
+        indexing a numpy array returns a np.uint64 scalar, and bit operations on those are far slower
+        than on python ints
+    '''
+    tables = {name: arrays[name] for name in ("knight_moves", "king_moves", "pawn_attacks", "rays", "between")}
+    tables["_knight_moves"] = _int_view(arrays["knight_moves"])
+    tables["_king_moves"] = _int_view(arrays["king_moves"])
+    tables["_pawn_attacks"] = _int_rows(arrays["pawn_attacks"])
+    tables["_rays"] = _int_rows(arrays["rays"])
+    tables["_between"] = _int_rows(arrays["between"])
+    
+    # Magic attack tables are split back into one view per square. The masks and shifts are only
+    # 64 entries each, so they are copied into lists
+    for slider in ("bishop", "rook"):
+        offsets = arrays[f"{slider}_offsets"].tolist()
+        table = _int_view(arrays[f"{slider}_table"])
+        tables[f"{slider}_masks"] = arrays[f"{slider}_masks"].tolist()
+        tables[f"{slider}_shifts"] = arrays[f"{slider}_shifts"].tolist()
+        tables[f"{slider}_attacks"] = [table[offsets[square]:offsets[square + 1]] for square in range(64)]
+    
+    return tables
+
+
+class PositionInfo:
+    '''
+        Check and pin information for one side's king, from MoveGenerator.get_position_info
+        checkers: bitboard of enemy pieces giving check
+        check_mask: squares a non king move must land on, which is every square when not in check,
+        the checker and the squares between it and the king in single check, and none in double check
+        pinned: bitboard of our pieces pinned to the king
+        pin_rays: square of each pinned piece -> the squares it can still move to, up to and including the pinner
+        enemy_attacks: every square attacked by the opponent, looking through our king
+    '''
+    __slots__ = ("king_square", "checkers", "check_mask", "pinned", "pin_rays", "enemy_attacks")
+    
+    def __init__(self, king_square: int, checkers: int, check_mask: int, pinned: int, pin_rays: dict[int, int], enemy_attacks: int):
+        self.king_square = king_square
+        self.checkers = checkers
+        self.check_mask = check_mask
+        self.pinned = pinned
+        self.pin_rays = pin_rays
+        self.enemy_attacks = enemy_attacks
+
+
 class MoveGenerator:
-    def __init__(self):
+    def __init__(self, table_cache: str | None = None):
+        '''
+            The tables are built by the first MoveGenerator in a process and shared by the rest. With a
+            table cache path, the first one memory maps them from that file instead, or builds them. The
+            file is written whenever a path is given and it is missing or out of date, even if the tables
+            were already set up, and a file which can't be written is skipped
+        '''
+        global _tables, _table_arrays
+        if table_cache is not None and table_cache not in _checked_caches:
+            arrays = _load_table_cache(table_cache)
+            if _tables is None and arrays is not None:
+                _table_arrays = arrays
+                _tables = _prepare_tables(arrays)
+            if arrays is None:
+                if _table_arrays is None:
+                    _table_arrays = self._build_tables()
+                _save_table_cache(table_cache, _table_arrays)
+            _checked_caches.add(table_cache)
+        
+        if _tables is None:
+            if _table_arrays is None:
+                _table_arrays = self._build_tables()
+            _tables = _prepare_tables(_table_arrays)
+        
+        self.__dict__.update(_tables)
+        # Written into by get_legal_moves, which copies the moves out into a list
+        self._scratch_moves = array('H', bytes(2 * MAX_MOVES))
+    
+    
+    def _build_tables(self) -> dict[str, np.ndarray]:
         self.knight_moves = np.zeros(64, dtype=np.uint64) 
         self.king_moves = np.zeros(64, dtype=np.uint64) 
         self.pawn_attacks = np.zeros((2,64), dtype=np.uint64) 
@@ -46,6 +235,17 @@ class MoveGenerator:
         self._init_rays()
         self._init_between_masks()
         
+        arrays = {
+            "knight_moves": self.knight_moves,
+            "king_moves": self.king_moves,
+            "pawn_attacks": self.pawn_attacks,
+            "rays": self.rays,
+            "between": self.between,
+        }
+        arrays.update(self._init_magic_tables())
+        
+        return arrays
+        
     
     def _init_rays(self):
         for square in range(64):
@@ -153,14 +353,13 @@ class MoveGenerator:
                 self.pawn_attacks[Colour.BLACK][square] |= pos >> 7
             
     
-    def _get_sliding_moves(self, board: "Board", piece: Piece, squareIndex: int) -> np.uint64:
+    def _get_ray_attacks(self, rays: list, dirs: list, square_index: int, occupancy: int) -> int:
         '''
-            Plan:
             Iterate through the directions
-            I use self.rays along with the direction to figure out possible moves
-            If direction is NW, N, NE, E, then I use MSB on occupancy & ray to find
+            I use the rays along with the direction to figure out possible moves
+            If direction is NW, N, NE, E, then I use LSB on occupancy & ray to find
             the first square in that direction that is blocked
-            If direction is W, Sw, S, SE, then I use LSB. 
+            If direction is W, SW, S, SE, then I use MSB. 
             
             Using the blocked index, we take the ray in the same direction, then xor this
             with the original to find the valid moves.
@@ -168,30 +367,95 @@ class MoveGenerator:
             We leave in the blocked index as this may be a capturable piece. When retrieving moves,
             we remove all moves that capture our own piece
         '''
-        moves = np.uint64(0)
-        
-        match piece:
-            case Piece.BISHOP:
-                dirs = [Direction.NE, Direction.SE, Direction.SW, Direction.NW]
-            case Piece.ROOK:
-                dirs = [Direction.N, Direction.S, Direction.W, Direction.E]
-            case Piece.QUEEN:
-                dirs = [Direction.NE, Direction.SE, Direction.SW, Direction.NW, Direction.N, Direction.S, Direction.W, Direction.E]
-            case _:
-                return np.uint64(0)
-        
-        POS_DIR = [Direction.NW, Direction.N, Direction.NE, Direction.E]
+        moves = 0
         for dir in dirs:
-            blocked_bits = board.get_occupancy() & self.rays[squareIndex][dir]
+            blocked_bits = occupancy & rays[square_index][dir]
             if blocked_bits == 0:
-                moves |= self.rays[squareIndex][dir]
+                moves |= rays[square_index][dir]
                 continue
             blocker_bit = get_lsb_index(blocked_bits) if dir in POS_DIR else get_msb_index(blocked_bits)
             
-            blocked_moves = self.rays[blocker_bit][dir]
-            moves |= self.rays[squareIndex][dir] ^ blocked_moves
+            blocked_moves = rays[blocker_bit][dir]
+            moves |= rays[square_index][dir] ^ blocked_moves
             
-        return moves 
+        return moves
+    
+    
+    def _init_magic_tables(self) -> dict[str, np.ndarray]:
+        '''
+            For every square, the relevant blockers of a slider are the squares along its rays, excluding
+            the last square on each ray since a piece there can't block anything further. Every subset of
+            this mask is enumerated, and its attack set is stored at the index given by the magic hash.
+            The tables of all squares are stored end to end, with the start of each square's table in offsets
+        '''
+        rays = self.rays.tolist()
+        # Last squares of each ray, indexed by direction
+        edges = [0] * 8
+        edges[Direction.N] = int(RANK_MASK[Rank.EIGHT])
+        edges[Direction.NE] = int(RANK_MASK[Rank.EIGHT] | FILE_MASK[File.H])
+        edges[Direction.E] = int(FILE_MASK[File.H])
+        edges[Direction.SE] = int(RANK_MASK[Rank.ONE] | FILE_MASK[File.H])
+        edges[Direction.S] = int(RANK_MASK[Rank.ONE])
+        edges[Direction.SW] = int(RANK_MASK[Rank.ONE] | FILE_MASK[File.A])
+        edges[Direction.W] = int(FILE_MASK[File.A])
+        edges[Direction.NW] = int(RANK_MASK[Rank.EIGHT] | FILE_MASK[File.A])
+        
+        arrays = {}
+        for slider, dirs, magics in (("bishop", BISHOP_DIRS, BISHOP_MAGICS), ("rook", ROOK_DIRS, ROOK_MAGICS)):
+            masks, shifts, offsets, attacks = [], [], [0], []
+            for square in range(64):
+                mask = 0
+                for dir in dirs:
+                    mask |= rays[square][dir] & ~edges[dir]
+                shift = 64 - mask.bit_count()
+                table = [0] * (1 << mask.bit_count())
+                
+                # Carry-rippler trick to walk every subset of the mask
+                blockers = 0
+                while True:
+                    index = ((blockers * magics[square]) & FULL_BITBOARD) >> shift
+                    table[index] = self._get_ray_attacks(rays, dirs, square, blockers)
+                    blockers = (blockers - mask) & mask
+                    if blockers == 0:
+                        break
+                
+                masks.append(mask)
+                shifts.append(shift)
+                attacks.extend(table)
+                offsets.append(len(attacks))
+            
+            arrays[f"{slider}_masks"] = np.array(masks, dtype=np.uint64)
+            arrays[f"{slider}_shifts"] = np.array(shifts, dtype=np.uint64)
+            arrays[f"{slider}_offsets"] = np.array(offsets, dtype=np.uint64)
+            arrays[f"{slider}_table"] = np.array(attacks, dtype=np.uint64)
+        
+        return arrays
+    
+    
+    def get_bishop_attacks(self, square_index: int, occupancy: int) -> int:
+        return self.bishop_attacks[square_index][(((occupancy & self.bishop_masks[square_index]) * BISHOP_MAGICS[square_index]) & FULL_BITBOARD) >> self.bishop_shifts[square_index]]
+    
+    
+    def get_rook_attacks(self, square_index: int, occupancy: int) -> int:
+        return self.rook_attacks[square_index][(((occupancy & self.rook_masks[square_index]) * ROOK_MAGICS[square_index]) & FULL_BITBOARD) >> self.rook_shifts[square_index]]
+    
+    
+    def _get_sliding_moves(self, board: "Board", piece: Piece, squareIndex: int) -> int:
+        '''
+            Sliding moves are looked up in the magic attack tables. As with ray scanning, the first
+            blocker in each direction is included as it may be a capturable piece
+        '''
+        occupancy = board.get_occupancy()
+        
+        match piece:
+            case Piece.BISHOP:
+                return self.get_bishop_attacks(squareIndex, occupancy)
+            case Piece.ROOK:
+                return self.get_rook_attacks(squareIndex, occupancy)
+            case Piece.QUEEN:
+                return self.get_bishop_attacks(squareIndex, occupancy) | self.get_rook_attacks(squareIndex, occupancy)
+            case _:
+                return 0
             
 
     def _init_between_masks(self):
@@ -213,7 +477,7 @@ class MoveGenerator:
                     ray &= ray - 1
                 
 
-    def generate_pawn_moves(self, board: "Board", piece: Piece, colour: Colour, squareIndex: int) -> np.uint64:
+    def generate_pawn_moves(self, board: "Board", piece: Piece, colour: Colour, squareIndex: int) -> int:
         '''
             We need to handle
             1. Moving pawn forward by one square if the square infront is empty
@@ -224,10 +488,10 @@ class MoveGenerator:
             5. Promotion. After the move, we check if it is white on rank 8, or black on rank 7. I need to construct
             a UI for promotion so that the user can select which piece to promote with. This will also be done in make move.
         '''
-        moves = np.uint64(0)
-        pos = np.uint64(1) << squareIndex
+        moves = 0
+        pos = 1 << squareIndex
         occupancy = board.get_occupancy()
-        opponent_occupancy = board.get_colour_occupancy(Colour.WHITE) if colour == Colour.BLACK else board.get_colour_occupancy(Colour.BLACK)
+        opponent_occupancy = board.get_colour_occupancy(colour.opposite)
         if colour == Colour.WHITE:
             infront = pos << 8
             two_infront = infront << 8
@@ -235,7 +499,7 @@ class MoveGenerator:
             if occupancy & infront == 0:
                 moves |= infront
             # Moving two squares forward
-            if (occupancy & two_infront == 0) and (pos & RANK_MASK[Rank.TWO] != 0):
+            if (occupancy & (infront | two_infront) == 0) and (pos & RANK_2 != 0):
                 moves |= two_infront
         elif colour == Colour.BLACK:
             infront = pos >> 8
@@ -244,96 +508,142 @@ class MoveGenerator:
             if occupancy & infront == 0:
                 moves |= infront
             # Moving two squares forward
-            if (occupancy & two_infront == 0) and (pos & RANK_MASK[Rank.SEVEN] != 0):
+            if (occupancy & (infront | two_infront) == 0) and (pos & RANK_7 != 0):
                 moves |= two_infront
                 
         # Including en passant in captures
         if board.ep_target != -1:
-            opponent_occupancy |= np.uint64(1) << board.ep_target
+            opponent_occupancy |= 1 << board.ep_target
             
-        moves |= self.pawn_attacks[colour][squareIndex] & opponent_occupancy
+        moves |= self._pawn_attacks[colour][squareIndex] & opponent_occupancy
  
         return moves
  
  
-    def generate_castling_moves(self, board: "Board", colour: Colour) -> np.uint64:
+    def generate_castling_moves(self, board: "Board", colour: Colour) -> int:
         castling_rights = board.castling_rights
-        moves = np.uint64(0)
+        moves = 0
         occupancy = board.get_occupancy()
         
         if colour == Colour.WHITE:
             # Check white king side
-            if (Castling.WK & castling_rights) and (occupancy & np.uint64(0b01100000) == 0):
-                moves |= np.uint64(1) << 6
+            if (Castling.WK & castling_rights) and (occupancy & 0b01100000 == 0):
+                moves |= 1 << 6
             # Check white queen side
-            if (Castling.WQ & castling_rights) and (occupancy & np.uint64(0b00001110) == 0):
-                moves |= np.uint64(1) << 2
+            if (Castling.WQ & castling_rights) and (occupancy & 0b00001110 == 0):
+                moves |= 1 << 2
         elif colour == Colour.BLACK:
             # Check black king side
-            if (Castling.BK & castling_rights) and (occupancy & (np.uint64(0b01100000) << 56) == 0):
-                moves |= np.uint64(1) << 62
+            if (Castling.BK & castling_rights) and (occupancy & (0b01100000 << 56) == 0):
+                moves |= 1 << 62
             # Check black queen side
-            if (Castling.BQ & castling_rights) and (occupancy & (np.uint64(0b00001110) << 56) == 0):
-                moves |= np.uint64(1) << 58
+            if (Castling.BQ & castling_rights) and (occupancy & (0b00001110 << 56) == 0):
+                moves |= 1 << 58
                 
         return moves
     
     
-    def get_attackers(self, board: "Board", colour: Colour, king_square: int) -> np.uint64:
+    def get_attackers(self, board: "Board", colour: Colour, king_square: int, occupancy: int | None = None) -> int:
         '''
             We get the position of the king, and place all different types of pieces 
-            on it to see how many attackers we have
+            on it to see how many attackers we have. Any square can be passed in, and an occupancy
+            can be passed in to look through pieces, as with is_square_attacked
         '''
-        attackers = np.uint64(0)
+        attackers = 0
         opponent_colour = colour.opposite
         
         # Pawn attackers
-        attackers |= self.pawn_attacks[colour][king_square] & board.bitboards[opponent_colour][Piece.PAWN]
+        attackers |= self._pawn_attacks[colour][king_square] & board.bitboards[opponent_colour][Piece.PAWN]
         
         # Knight attackers
-        attackers |= self.knight_moves[king_square] & board.bitboards[opponent_colour][Piece.KNIGHT]
+        attackers |= self._knight_moves[king_square] & board.bitboards[opponent_colour][Piece.KNIGHT]
         
-        # Sliding attackers (Bishop, Rook, Queen)
-        attackers |= self._get_sliding_moves(board, Piece.BISHOP, king_square) & board.bitboards[opponent_colour][Piece.BISHOP]
-        attackers |= self._get_sliding_moves(board, Piece.ROOK, king_square) & board.bitboards[opponent_colour][Piece.ROOK]
-        attackers |= self._get_sliding_moves(board, Piece.QUEEN, king_square) & board.bitboards[opponent_colour][Piece.QUEEN]
+        # Sliding attackers (Bishop, Rook, Queen). Queens are found by both lookups
+        if occupancy is None:
+            occupancy = board.get_occupancy()
+        queens = board.bitboards[opponent_colour][Piece.QUEEN]
+        attackers |= self.get_bishop_attacks(king_square, occupancy) & (board.bitboards[opponent_colour][Piece.BISHOP] | queens)
+        attackers |= self.get_rook_attacks(king_square, occupancy) & (board.bitboards[opponent_colour][Piece.ROOK] | queens)
         
         return attackers
     
     
-    def is_square_attacked(self, board: "Board", colour: Colour, square: int) -> bool:
+    def is_square_attacked(self, board: "Board", colour: Colour, square: int, occupancy: int | None = None) -> bool:
         '''
-            get_attackers, but returns earlier if an attacker is found
+            get_attackers, but returns earlier if an attacker is found. The enemy king also counts as an
+            attacker here. An occupancy can be passed in to look through pieces, such as our own king
+            when checking the squares it moves to
         '''
-        opponent_colour = Colour.BLACK if colour == Colour.WHITE else colour.WHITE
+        opponent_colour = colour.opposite
         
         # Pawn attackers
-        if self.pawn_attacks[colour][square] & board.bitboards[opponent_colour][Piece.PAWN]:
+        if self._pawn_attacks[colour][square] & board.bitboards[opponent_colour][Piece.PAWN]:
             return True
         
         # Knight attackers
-        if self.knight_moves[square] & board.bitboards[opponent_colour][Piece.KNIGHT]:
+        if self._knight_moves[square] & board.bitboards[opponent_colour][Piece.KNIGHT]:
             return True
         
-        # Sliding attackers (Bishop, Rook, Queen)
-        if self._get_sliding_moves(board, Piece.BISHOP, square) & board.bitboards[opponent_colour][Piece.BISHOP]:
+        # King attackers
+        if self._king_moves[square] & board.bitboards[opponent_colour][Piece.KING]:
             return True
         
-        if self._get_sliding_moves(board, Piece.ROOK, square) & board.bitboards[opponent_colour][Piece.ROOK]:
+        # Sliding attackers (Bishop, Rook, Queen)
+        if occupancy is None:
+            occupancy = board.get_occupancy()
+        queens = board.bitboards[opponent_colour][Piece.QUEEN]
+        if self.get_bishop_attacks(square, occupancy) & (board.bitboards[opponent_colour][Piece.BISHOP] | queens):
             return True
         
-        if self._get_sliding_moves(board, Piece.QUEEN, square) & board.bitboards[opponent_colour][Piece.QUEEN]:
+        if self.get_rook_attacks(square, occupancy) & (board.bitboards[opponent_colour][Piece.ROOK] | queens):
             return True
 
         return False
+    
+    
+    def get_attack_map(self, board: "Board", colour: Colour, occupancy: int | None = None) -> int:
+        '''
+            Bitboard of every square attacked by colour's pieces, whether or not it holds a piece.
+            Pawns are shifted all at once, and the other pieces use the attack tables. An occupancy
+            can be passed in to look through pieces, as with is_square_attacked
+        '''
+        bitboards = board.bitboards[colour]
+        if occupancy is None:
+            occupancy = board.get_occupancy()
+        
+        pawns = int(bitboards[Piece.PAWN])
+        if colour == Colour.WHITE:
+            attacks = ((pawns & NOT_A_FILE) << 7) | ((pawns & NOT_H_FILE) << 9)
+        else:
+            attacks = ((pawns & NOT_A_FILE) >> 9) | ((pawns & NOT_H_FILE) >> 7)
+        
+        attacks |= self._king_moves[get_lsb_index(bitboards[Piece.KING])]
+        
+        knights = int(bitboards[Piece.KNIGHT])
+        while knights:
+            attacks |= self._knight_moves[get_lsb_index(knights)]
+            knights &= knights - 1
+        
+        queens = int(bitboards[Piece.QUEEN])
+        bishops = int(bitboards[Piece.BISHOP]) | queens
+        while bishops:
+            attacks |= self.get_bishop_attacks(get_lsb_index(bishops), occupancy)
+            bishops &= bishops - 1
+        
+        rooks = int(bitboards[Piece.ROOK]) | queens
+        while rooks:
+            attacks |= self.get_rook_attacks(get_lsb_index(rooks), occupancy)
+            rooks &= rooks - 1
+        
+        return attacks
 
     
-    def get_pseudo_legal_moves(self, board: "Board", piece: Piece, colour: Colour, squareIndex: int) -> np.uint64:
+    def get_pseudo_legal_moves(self, board: "Board", piece: Piece, colour: Colour, squareIndex: int) -> int:
         match piece:
             case Piece.PAWN:
                 moves = self.generate_pawn_moves(board, piece, colour, squareIndex)
             case Piece.KNIGHT:
-                moves = self.knight_moves[squareIndex]
+                moves = self._knight_moves[squareIndex]
             case Piece.BISHOP:
                 moves = self._get_sliding_moves(board, piece, squareIndex)
             case Piece.ROOK:
@@ -341,171 +651,300 @@ class MoveGenerator:
             case Piece.QUEEN:
                 moves = self._get_sliding_moves(board, piece, squareIndex)
             case Piece.KING:
-                moves = self.king_moves[squareIndex] | self.generate_castling_moves(board, colour)
+                moves = self._king_moves[squareIndex] | self.generate_castling_moves(board, colour)
         
         colour_occupancy = board.get_colour_occupancy(colour)
         return moves & ~colour_occupancy
     
     
-    def get_legal_moves(self, board: "Board", colour: Colour) -> list[np.int16]:
+    def get_position_info(self, board: "Board", colour: Colour) -> PositionInfo:
+        '''
+            Finds the checkers and pinned pieces of colour's king in one pass from the king square.
+            Enemy sliders are looked up from the king with only the enemy pieces as blockers, so the
+            lookups x-ray through our own pieces. Each slider seen this way either has nothing between
+            it and the king, so it gives check, or only our own pieces, and if there is exactly one
+            then that piece is pinned
+        '''
+        opponent_colour = colour.opposite
+        enemy_bitboards = board.bitboards[opponent_colour]
+        king_square = get_lsb_index(board.bitboards[colour][Piece.KING])
+        occupancy = board.get_occupancy()
+        enemy_occupancy = board.get_colour_occupancy(opponent_colour)
+        queens = int(enemy_bitboards[Piece.QUEEN])
+        
+        checkers = self._pawn_attacks[colour][king_square] & int(enemy_bitboards[Piece.PAWN])
+        checkers |= self._knight_moves[king_square] & int(enemy_bitboards[Piece.KNIGHT])
+        
+        snipers = self.get_bishop_attacks(king_square, enemy_occupancy) & (int(enemy_bitboards[Piece.BISHOP]) | queens)
+        snipers |= self.get_rook_attacks(king_square, enemy_occupancy) & (int(enemy_bitboards[Piece.ROOK]) | queens)
+        
+        pinned = 0
+        pin_rays = {}
+        while snipers:
+            sniper = get_lsb_index(snipers)
+            snipers &= snipers - 1
+            between = self._between[king_square][sniper]
+            blockers = between & occupancy
+            if blockers == 0:
+                checkers |= 1 << sniper
+            elif blockers & (blockers - 1) == 0:
+                pinned |= blockers
+                pin_rays[get_lsb_index(blockers)] = between | (1 << sniper)
+        
+        # With a single checker we can capture it or, if it is a slider, block it. Between masks are
+        # empty for knights and adjacent pieces, so this works for every kind of checker. With two
+        # checkers only the king can move
+        num_checkers = checkers.bit_count()
+        if num_checkers == 0:
+            check_mask = FULL_BITBOARD
+        elif num_checkers == 1:
+            check_mask = checkers | self._between[king_square][get_lsb_index(checkers)]
+        else:
+            check_mask = 0
+        
+        # The king is taken out of the occupancy, otherwise it would block a slider's attack on
+        # the squares behind it, and could step back along the line of a check
+        enemy_attacks = self.get_attack_map(board, opponent_colour, occupancy ^ (1 << king_square))
+        
+        return PositionInfo(king_square, checkers, check_mask, pinned, pin_rays, enemy_attacks)
+    
+    
+    def get_legal_moves(self, board: "Board", colour: Colour) -> list[int]:
+        '''
+            Legal moves as a list of 16 bit encoded moves. Search and perft should write into a
+            reusable buffer with generate_legal_moves instead, which allocates nothing
+        '''
+        count = self.generate_legal_moves(board, colour, self._scratch_moves)
+        return self._scratch_moves[:count].tolist()
+    
+    
+    def is_legal_move(self, board: "Board", move: int, info: PositionInfo | None = None) -> bool:
+        '''
+            Whether a move, flags included, is legal for the side to move. Only the moves of the piece on
+            its source square are generated, so this is cheap enough to check hash moves and killers
+        '''
+        count = self.generate_legal_moves(board, board.side_to_move, self._scratch_moves, info=info, source_mask=1 << decode_source(move))
+        for index in range(count):
+            if self._scratch_moves[index] == move:
+                return True
+        
+        return False
+    
+    
+    def generate_legal_moves(self, board: "Board", colour: Colour, buffer: array, start: int = 0, gen_type: GenType = GenType.ALL,
+                             info: PositionInfo | None = None, source_mask: int = FULL_BITBOARD) -> int:
         '''
         https://peterellisjones.com/posts/generating-legal-chess-moves-efficiently/
         When there is a single attacker, we can either
         1. Move the king
         2. Block the attack (if it is a rook, bishop or queen)
         3. Capture the attacker
-        
-        For the king, legal moves are moves which do not move into an attacked square. We can do this by using
-        get_attackers on every legal king move, including the inbetween squares for castling
-        We can use a similar approach to get_sliding_moves to find squares which are inbetween the king and attacker
-        We already have moves which capture the attacker through its bit location in get_attackers
         For multiple attackers, we must move the king out of the way
-            
-        For pins, I can again use a similar approach to get_sliding_moves for the sliding pieces. For each
-        direction, I check if the king is along the ray. If so, the king is the 'blocking' piece, and any pieces
-        along the ray are unable to move. We don't include the king in this ray
+        
+        For the king, legal moves are moves which do not move into an attacked square. We can do this by ANDing
+        its moves, and the squares it crosses when castling, with the map of squares the opponent attacks
+        
+        Every other piece's moves are its pseudo legal moves ANDed with the check mask, and with its pin ray
+        if it is pinned. Both come from get_position_info
+        
+        The 16-bit encoded moves are written into buffer from index start onwards, and the number of
+        moves written is returned. The buffer must have room for MAX_MOVES moves after start
+        
+        gen_type restricts generation to noisy or quiet moves, so a search can generate them in separate
+        stages, and source_mask restricts it to the pieces on those squares. The position info can be
+        passed in when it has already been computed for this position
         '''
-        # List of 16-bit encoded move integers
-        move_list = []
-        king_pos = get_lsb_index(board.bitboards[colour][Piece.KING])
-        attackers = self.get_attackers(board, colour, king_pos)
-        num_attackers = attackers.bit_count()
+        index = start
+        if info is None:
+            info = self.get_position_info(board, colour)
+        king_pos = info.king_square
+        num_attackers = info.checkers.bit_count()
+        own_occupancy = board.get_colour_occupancy(colour)
         opposite_colour_occupancy = board.get_colour_occupancy(colour.opposite)
+        occupancy = own_occupancy | opposite_colour_occupancy
         
-        # Add legal king moves. This is the same regardless of the number of attackers
-        candidate_king_moves = self.get_pseudo_legal_moves(board, Piece.KING, colour, king_pos)
-        while candidate_king_moves:
-            move_index = get_lsb_index(candidate_king_moves)
-            candidate_king_moves ^= 1 << move_index
-            is_capture = opposite_colour_occupancy & (1 << move_index)
-            if self.is_square_attacked(board, colour, move_index):
-                continue
-                
-            if abs(move_index - king_pos) == 1:
-                # Regular king move
-                move_list.append(encode_move(king_pos, move_index, MoveFlags.CAPTURE if is_capture else MoveFlags.QUIET))
-            else:
-                # Castling. We check if the inbetween squares are attacked
-                legal = True
-                for sq_index in range(min(king_pos, move_index) + 1, max(king_pos, move_index)):
-                    if self.is_square_attacked(board, colour, sq_index):
-                        legal = False
-                        break
-                
-                # King side castling
-                if legal and abs(move_index - king_pos) == 2:
-                    move_list.append(encode_move(king_pos, move_index, MoveFlags.KING_CASTLE))
-                # Queen side castling
-                elif legal and abs(move_index - king_pos) == 3:
-                    move_list.append(encode_move(king_pos, move_index, MoveFlags.QUEEN_CASTLE))
-        
-        # By default, all moves are legal. 
-        # The capture mask represents legal capture moves
-        # The push mask represents normal legal moves
-        capture_mask = np.uint64(0xFFFFFFFFFFFFFFFF)
-        push_mask = np.uint64(0xFFFFFFFFFFFFFFFF)
-        pinned_mask = np.uint64(0)
-        
-        # We can either block or capture the attacker      
-        if num_attackers == 1:
-            # Legal capture moves are just capturing the attackers
-            capture_mask = attackers
-            attacker_pos = get_lsb_index(attackers)
-            
-            # We block
-            if board.is_slider(attacker_pos, colour.opposite):
-                push_mask = self.between[attacker_pos][king_pos]
-            # If piece isn't slider, we can't block it
-            else:
-                push_mask = np.uint64(0)
-        # We must move the king; all other moves are illegal
-        elif num_attackers == 2:
-            capture_mask = np.uint64(0)
-            push_mask = np.uint64(0)
-        
-        # Calculating moves for pinned pieces
-        enemy_pieces = opposite_colour_occupancy
-        while enemy_pieces:
-            enemy_piece_pos = get_lsb_index(enemy_pieces)
-            enemy_pieces ^= 1 << enemy_piece_pos
-            
-            if not board.is_slider(enemy_piece_pos, colour.opposite):
-                continue  
-            
-            enemy_piece_type = board.get_piece_at(enemy_piece_pos, colour.opposite)
-            if enemy_piece_type is None:
-                continue
-            
-            dirs = []
-            match enemy_piece_type:
-                case Piece.BISHOP:
-                    dirs = [Direction.NE, Direction.SE, Direction.SW, Direction.NW]
-                case Piece.ROOK:
-                    dirs = [Direction.N, Direction.S, Direction.W, Direction.E]
-                case Piece.QUEEN:
-                    dirs = [Direction.NE, Direction.SE, Direction.SW, Direction.NW, Direction.N, Direction.S, Direction.W, Direction.E]
-                case _:
-                    continue
-            
-            POS_DIR = [Direction.NW, Direction.N, Direction.NE, Direction.E]
-            for dir in dirs:
-                enemy_blocked_bits = board.get_occupancy() & self.rays[enemy_piece_pos][dir]
-                if enemy_blocked_bits == 0:
+        # Squares non pawn moves may land on for this type of generation
+        if gen_type == GenType.NOISY:
+            target_mask = opposite_colour_occupancy
+        elif gen_type == GenType.QUIET:
+            target_mask = FULL_BITBOARD ^ occupancy
+        else:
+            target_mask = FULL_BITBOARD ^ own_occupancy
+        
+        # Add legal king moves. This is the same regardless of the number of attackers.
+        if source_mask & (1 << king_pos):
+            king_moves = self._king_moves[king_pos] & target_mask & ~info.enemy_attacks
+            index = self._add_bitboard_to_buffer(king_pos, king_moves, buffer, index, opposite_colour_occupancy)
+        
+        # Castling, where neither the squares the king crosses nor its target can be attacked
+        if num_attackers == 0 and gen_type != GenType.NOISY and source_mask & (1 << king_pos):
+            castling_moves = self.generate_castling_moves(board, colour)
+            while castling_moves:
+                target = get_lsb_index(castling_moves)
+                castling_moves &= castling_moves - 1
+                if (self._between[king_pos][target] | (1 << target)) & info.enemy_attacks:
                     continue
-                enemy_candidate_bit = get_lsb_index(enemy_blocked_bits) if dir in POS_DIR else get_msb_index(enemy_blocked_bits)
                 
-                # We take sliding moves from the king in the opposite direciton
-                king_blocked_bits = board.get_occupancy() & self.rays[king_pos][dir.opposite]
-                king_candidate_bit = get_lsb_index(king_blocked_bits) if dir not in POS_DIR else get_msb_index(king_blocked_bits)
-                
-                # There is a single piece blocking check, and it is our piece so it is pinned
-                candidate_piece = board.get_piece_at(enemy_candidate_bit, colour)
-                if (enemy_candidate_bit == king_candidate_bit) and (candidate_piece is not None):
-                    pinned_mask |= 1 << enemy_candidate_bit
-                    psuedo_legal_moves = self.get_pseudo_legal_moves(board, candidate_piece, colour, enemy_candidate_bit)
-                    legal_moves = (self.between[king_pos][enemy_piece_pos] | (1 << enemy_piece_pos)) & psuedo_legal_moves
-                    self._add_bitboard_to_move_list(enemy_candidate_bit, legal_moves, capture_mask, push_mask, move_list, opposite_colour_occupancy)
-        
-        # We iterate over all pseudo_legal moves and use the masks to remove illegal moves
-        occupancy = board.get_colour_occupancy(colour)
-        while occupancy:
-            piece_index = get_lsb_index(occupancy)
-            occupancy &= occupancy - 1
-            if pinned_mask & (1 << piece_index):
-                print(f"Piece at {piece_index} is pinned")
-                continue
-            
-            occupancy &= occupancy - 1
-            piece_type = board.get_piece_at(piece_index, colour)
-            if piece_type is None:
-                continue
-            
-            psuedo_legal_moves = self.get_pseudo_legal_moves(board, piece_type, colour, piece_index)
-            self._add_bitboard_to_move_list(piece_index, psuedo_legal_moves, capture_mask, push_mask, move_list, opposite_colour_occupancy)
+                # King side castling if the target is to the right of the king, otherwise queen side
+                buffer[index] = encode_move(king_pos, target, MoveFlags.KING_CASTLE if target > king_pos else MoveFlags.QUEEN_CASTLE)
+                index += 1
+        
+        # Only king moves are legal in double check
+        if num_attackers > 1:
+            return index - start
+        
+        check_mask = info.check_mask
+        pinned = info.pinned
+        
+        # Unpinned pawns are generated all at once, and pinned pawns one at a time along their pin ray.
+        # The check mask covers both captures of the checker and pushes which block it. Pushes to the
+        # last rank are promotions, so they count as noisy
+        capture_mask = check_mask
+        push_mask = check_mask
+        if gen_type == GenType.NOISY:
+            push_mask &= PROMOTION_RANKS
+        elif gen_type == GenType.QUIET:
+            capture_mask = 0
+            push_mask &= ~PROMOTION_RANKS
+        
+        pawns = int(board.bitboards[colour][Piece.PAWN]) & source_mask
+        index = self.add_pawn_moves_to_buffer(board, colour, pawns & ~pinned, capture_mask, push_mask, buffer, index)
+        pinned_pawns = pawns & pinned
+        while pinned_pawns:
+            source = get_lsb_index(pinned_pawns)
+            pinned_pawns &= pinned_pawns - 1
+            pin_ray = info.pin_rays[source]
+            index = self.add_pawn_moves_to_buffer(board, colour, 1 << source, capture_mask & pin_ray, push_mask & pin_ray, buffer, index)
+        
+        # A knight can never move along the line it is pinned on
+        legal_mask = check_mask & target_mask
+        knights = int(board.bitboards[colour][Piece.KNIGHT]) & ~pinned & source_mask
+        while knights:
+            source = get_lsb_index(knights)
+            knights &= knights - 1
+            index = self._add_bitboard_to_buffer(source, self._knight_moves[source] & legal_mask, buffer, index, opposite_colour_occupancy)
+        
+        # Queens are found by both the diagonal and the orthogonal pass
+        queens = int(board.bitboards[colour][Piece.QUEEN])
+        for sliders, get_attacks in (
+            ((int(board.bitboards[colour][Piece.BISHOP]) | queens) & source_mask, self.get_bishop_attacks),
+            ((int(board.bitboards[colour][Piece.ROOK]) | queens) & source_mask, self.get_rook_attacks),
+        ):
+            while sliders:
+                source = get_lsb_index(sliders)
+                sliders &= sliders - 1
+                moves = get_attacks(source, occupancy) & legal_mask
+                if pinned & (1 << source):
+                    moves &= info.pin_rays[source]
+                index = self._add_bitboard_to_buffer(source, moves, buffer, index, opposite_colour_occupancy)
+        
+        # En passant is left to the end, as it removes two pieces from a line and so can't be
+        # checked with the masks
+        if board.ep_target != -1 and gen_type != GenType.QUIET:
+            ep_pawns = self._pawn_attacks[colour.opposite][board.ep_target] & pawns
+            while ep_pawns:
+                source = get_lsb_index(ep_pawns)
+                ep_pawns &= ep_pawns - 1
+                if self._is_ep_legal(board, colour, source, king_pos):
+                    buffer[index] = encode_move(source, board.ep_target, MoveFlags.EP_CAPTURE)
+                    index += 1
             
-        return move_list
+        return index - start
+    
+    
+    def _is_ep_legal(self, board: "Board", colour: Colour, source: int, king_pos: int) -> bool:
+        '''
+            En passant is checked by playing it on the occupancy, and seeing if the king is attacked afterwards.
+            This covers the captured pawn being the checker, and both pawns leaving the king's rank at once
+        '''
+        opponent_colour = colour.opposite
+        captured_square = board.ep_target - 8 if colour == Colour.WHITE else board.ep_target + 8
+        occupancy = (board.get_occupancy() ^ (1 << source) ^ (1 << captured_square)) | (1 << board.ep_target)
+        
+        if self._pawn_attacks[colour][king_pos] & int(board.bitboards[opponent_colour][Piece.PAWN]) & ~(1 << captured_square):
+            return False
+        if self._knight_moves[king_pos] & int(board.bitboards[opponent_colour][Piece.KNIGHT]):
+            return False
+        
+        queens = int(board.bitboards[opponent_colour][Piece.QUEEN])
+        if self.get_bishop_attacks(king_pos, occupancy) & (int(board.bitboards[opponent_colour][Piece.BISHOP]) | queens):
+            return False
+        if self.get_rook_attacks(king_pos, occupancy) & (int(board.bitboards[opponent_colour][Piece.ROOK]) | queens):
+            return False
+        
+        return True
     
 
-    def _add_bitboard_to_move_list(self, source: int, bitboard: np.uint64, capture_mask: np.uint64, push_mask: np.uint64, move_list: list, opponent_occupancy: np.uint64):
-        # 1. First, apply the Constraints (Legality)
-        # We combine both masks. A move is legal if it satisfies EITHER blocking OR capturing.
-        # (When not in check, both masks are all 1s, so everything allows)
-        legal_destinations = bitboard & (capture_mask | push_mask)
-
-        while legal_destinations:
-            next_move = get_lsb_index(legal_destinations)
-            legal_destinations &= legal_destinations - 1
-            
-            # 2. Convert Index to Bitboard for checking
-            dest_bit = np.uint64(1) << np.uint64(next_move)
-            
-            # 3. Determine Flag based on what is on the board
-            if dest_bit & opponent_occupancy:
-                move_list.append(encode_move(source, next_move, MoveFlags.CAPTURE))
-            else:
-                # Note: This marks En Passant as Quiet. 
-                # You might want to pass 'ep_target' to this function to mark EP correctly, 
-                # but for basic movement, QUIET is safer than CAPTURE for empty squares.
-                move_list.append(encode_move(source, next_move, MoveFlags.QUIET))
+    def _add_bitboard_to_buffer(self, source: int, bitboard: int, buffer: array, index: int, opponent_occupancy: int) -> int:
+        '''
+            Writes a move from source to every square of an already legal bitboard of destinations, flagged
+            as a capture if it lands on an opponent piece. Returns the index after the last move written
+        '''
+        while bitboard:
+            next_move = get_lsb_index(bitboard)
+            bitboard &= bitboard - 1
             
-            
\ No newline at end of file
+            flag = MoveFlags.CAPTURE if opponent_occupancy & (1 << next_move) else MoveFlags.QUIET
+            buffer[index] = encode_move(source, next_move, flag)
+            index += 1
+        
+        return index
+    
+    
+    def add_pawn_moves_to_buffer(self, board: "Board", colour: Colour, pawns: int, capture_mask: int, push_mask: int, buffer: array, index: int) -> int:
+        '''
+            Generates the moves of every pawn in the pawns bitboard at once. The whole bitboard is shifted
+            forward for pushes, and diagonally for captures, with the edge file masked off so captures
+            don't wrap around the board. The source of each target is then just the target minus the shift.
+            En passant is left to generate_legal_moves. Returns the index after the last move written
+        '''
+        empty = FULL_BITBOARD ^ board.get_occupancy()
+        enemies = board.get_colour_occupancy(colour.opposite) & capture_mask
+        
+        if colour == Colour.WHITE:
+            single_pushes = (pawns << 8) & empty
+            double_pushes = ((single_pushes & RANK_3) << 8) & empty & push_mask
+            single_pushes &= push_mask
+            east_captures = ((pawns & NOT_H_FILE) << 9) & enemies
+            west_captures = ((pawns & NOT_A_FILE) << 7) & enemies
+            push_offset, east_offset, west_offset = 8, 9, 7
+        else:
+            single_pushes = (pawns >> 8) & empty
+            double_pushes = ((single_pushes & RANK_6) >> 8) & empty & push_mask
+            single_pushes &= push_mask
+            east_captures = ((pawns & NOT_H_FILE) >> 7) & enemies
+            west_captures = ((pawns & NOT_A_FILE) >> 9) & enemies
+            push_offset, east_offset, west_offset = -8, -7, -9
+        
+        index = self._add_pawn_targets_to_buffer(single_pushes, push_offset, MoveFlags.QUIET, buffer, index)
+        index = self._add_pawn_targets_to_buffer(east_captures, east_offset, MoveFlags.CAPTURE, buffer, index)
+        index = self._add_pawn_targets_to_buffer(west_captures, west_offset, MoveFlags.CAPTURE, buffer, index)
+        
+        while double_pushes:
+            target = get_lsb_index(double_pushes)
+            double_pushes &= double_pushes - 1
+            buffer[index] = encode_move(target - 2 * push_offset, target, MoveFlags.DBL_PAWN_PUSH)
+            index += 1
+        
+        return index
+    
+    
+    def _add_pawn_targets_to_buffer(self, targets: int, offset: int, flag: MoveFlags, buffer: array, index: int) -> int:
+        # Targets on the last rank are added once for each promotion piece
+        promotions = targets & PROMOTION_RANKS
+        targets ^= promotions
+        
+        while targets:
+            target = get_lsb_index(targets)
+            targets &= targets - 1
+            buffer[index] = encode_move(target - offset, target, flag)
+            index += 1
+        
+        while promotions:
+            target = get_lsb_index(promotions)
+            promotions &= promotions - 1
+            for promotion in PROMOTION_FLAGS:
+                buffer[index] = encode_move(target - offset, target, promotion | flag)
+                index += 1
+        
+        return index
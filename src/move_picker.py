@@ -0,0 +1,115 @@
+from typing import Iterator, TYPE_CHECKING
+from constants import Piece, MoveFlags, GenType
+from move_stack import MoveStack
+from see import see, SEE_VALUES
+
+if TYPE_CHECKING:
+    from board import Board
+    from move_generator import MoveGenerator, PositionInfo
+
+'''
+    Search usually cuts off after one of the first few moves it tries, so moves are handed out in
+    stages, most likely to cut off first, and a stage is only generated once the one before it has
+    been used up:
+    1. The hash move, from the transposition table
+    2. Captures and promotions which don't lose material, most valuable victim first, then least
+       valuable attacker
+    3. Killer moves, quiet moves which caused a cutoff at the same ply elsewhere in the tree
+    4. The remaining quiet moves
+    5. Captures which lose material by static exchange evaluation
+'''
+
+# Flag bits shared by every capture and promotion
+NOISY_FLAGS = MoveFlags.CAPTURE | MoveFlags.KNIGHT_PROMOTION
+# Under promotions are almost never the best move, so they are tried after every capture
+UNDER_PROMOTION_PENALTY = 100
+
+
+def capture_score(board: "Board", move: int) -> int:
+    '''
+        MVV-LVA ordering score of a noisy move. Victims are worth far more than attackers, so any
+        capture of a more valuable piece comes first whatever captures it
+    '''
+    flag = move >> 12
+    score = 0
+    if flag & MoveFlags.CAPTURE:
+        if flag == MoveFlags.EP_CAPTURE:
+            victim = Piece.PAWN
+        else:
+            victim = board.mailbox[(move >> 6) & 0x3F] & 0b111
+        score = 8 * (victim + 1) - (board.mailbox[move & 0x3F] & 0b111)
+
+    if flag & MoveFlags.KNIGHT_PROMOTION:
+        if flag & 0b11 == 0b11:
+            score += 8 * Piece.QUEEN
+        else:
+            score -= UNDER_PROMOTION_PENALTY
+
+    return score
+
+
+def is_losing_capture(board: "Board", move: int, move_generator: "MoveGenerator") -> bool:
+    # Taking a piece worth at least as much as the attacker can't lose material, so the exchange
+    # only needs to be worked out for the rest
+    flag = move >> 12
+    if flag == MoveFlags.EP_CAPTURE or not flag & MoveFlags.CAPTURE:
+        return False
+    if SEE_VALUES[board.mailbox[(move >> 6) & 0x3F] & 0b111] >= SEE_VALUES[board.mailbox[move & 0x3F] & 0b111]:
+        return False
+
+    return see(board, move, move_generator) < 0
+
+
+def pick_moves(board: "Board", move_generator: "MoveGenerator", stack: MoveStack, ply: int, hash_move: int = 0,
+               killers: tuple[int, ...] = (), quiets: bool = True, info: "PositionInfo | None" = None) -> Iterator[int]:
+    '''
+        Yields the legal moves of the side to move in stages. Generated moves are written into the
+        stack's region for this ply, which is reused by each stage. The hash move and killers are
+        checked for legality before they are tried, and skipped when they come up again later.
+        Without quiets, only the hash move and the noisy moves which don't lose material are yielded.
+        The position info of the side to move can be passed in if the caller already has it
+    '''
+    colour = board.side_to_move
+    if info is None:
+        info = move_generator.get_position_info(board, colour)
+    moves = stack.moves
+    start = stack.start(ply)
+
+    if hash_move and move_generator.is_legal_move(board, hash_move, info):
+        yield hash_move
+    else:
+        hash_move = 0
+
+    count = move_generator.generate_legal_moves(board, colour, moves, start, GenType.NOISY, info)
+    stack.counts[ply] = count
+    captures = sorted(moves[start:start + count], key=lambda move: capture_score(board, move), reverse=True)
+    # The quiet stages overwrite the buffer, so losing captures are kept aside until after them
+    bad_captures = []
+    for move in captures:
+        if move == hash_move:
+            continue
+        if is_losing_capture(board, move, move_generator):
+            bad_captures.append(move)
+        else:
+            yield move
+
+    if not quiets:
+        return
+
+    tried_killers = []
+    for killer in killers:
+        # Killers are quiet moves, as noisy ones have already been tried in the captures stage
+        if killer == 0 or killer >> 12 & NOISY_FLAGS or killer == hash_move or killer in tried_killers:
+            continue
+        if move_generator.is_legal_move(board, killer, info):
+            tried_killers.append(killer)
+            yield killer
+
+    count = move_generator.generate_legal_moves(board, colour, moves, start, GenType.QUIET, info)
+    stack.counts[ply] = count
+    for index in range(start, start + count):
+        move = moves[index]
+        if move != hash_move and move not in tried_killers:
+            yield move
+
+    yield from bad_captures
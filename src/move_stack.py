@@ -0,0 +1,51 @@
+import numpy as np
+from array import array
+from constants import MAX_MOVES, MAX_PLY
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from board import Board
+    from move_generator import MoveGenerator
+
+'''
+    A search only needs the moves of the plies on its current path, so one buffer is allocated up
+    front and split into a fixed region of MAX_MOVES moves for each ply. Generating the moves of a
+    ply overwrites its region, and deeper plies never touch it, so nothing is allocated per node.
+'''
+
+
+class MoveStack:
+    __slots__ = ("moves", "counts", "_view")
+
+    def __init__(self, max_ply: int = MAX_PLY):
+        # 16-bit encoded moves, MAX_MOVES for each ply
+        self.moves = array('H', bytes(2 * MAX_MOVES * max_ply))
+        # Number of moves generated at each ply
+        self.counts = [0] * max_ply
+        # numpy view sharing the same memory, for vectorised move scoring
+        self._view = np.frombuffer(self.moves, dtype=np.uint16)
+
+
+    def generate(self, board: "Board", move_generator: "MoveGenerator", ply: int) -> int:
+        '''
+            Generates the legal moves of the side to move into the region of this ply, and returns how many there are
+        '''
+        count = move_generator.generate_legal_moves(board, board.side_to_move, self.moves, ply * MAX_MOVES)
+        self.counts[ply] = count
+
+        return count
+
+
+    def start(self, ply: int) -> int:
+        '''
+            Index into moves of the first move of a ply
+        '''
+        return ply * MAX_MOVES
+
+
+    def view(self, ply: int) -> np.ndarray:
+        '''
+            The moves of a ply as a uint16 array, without copying them
+        '''
+        start = ply * MAX_MOVES
+        return self._view[start:start + self.counts[ply]]
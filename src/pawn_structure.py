@@ -0,0 +1,193 @@
+from array import array
+from constants import Piece, Colour, Rank
+from move_generator import RANK_MASK, FULL_BITBOARD, NOT_A_FILE, NOT_H_FILE
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from board import Board
+
+'''
+    Pawn structure terms only depend on where the pawns are, which changes on few moves, so they are
+    cached in a pawn hash table keyed by the board's pawn key, and evaluating them is usually a probe.
+
+    Every term is worked out for all the pawns of a colour at once with fills: a pawn bitboard is
+    smeared up or down its files, then shifted sideways onto the neighbouring files, so one bitboard
+    holds every square in front of, behind or beside the pawns. Scores are (middlegame, endgame)
+    pairs, from white's point of view.
+'''
+
+DOUBLED_PENALTY = (10, 20)
+ISOLATED_PENALTY = (10, 15)
+BACKWARD_PENALTY = (8, 10)
+# Passed pawn bonuses by rank from the pawn's own side, as they are worth more the closer they are to promoting
+PASSED_BONUS = [(0, 0), (5, 10), (10, 20), (15, 35), (25, 60), (40, 100), (60, 150), (0, 0)]
+# Middlegame bonus for each of our pawns on the two ranks in front of the king, on its file or next to it
+SHIELD_BONUS = 10
+
+RANKS = [int(RANK_MASK[rank]) for rank in Rank]
+
+
+def north_fill(bitboard: int) -> int:
+    bitboard |= bitboard << 8
+    bitboard |= bitboard << 16
+    bitboard |= bitboard << 32
+    return bitboard & FULL_BITBOARD
+
+
+def south_fill(bitboard: int) -> int:
+    bitboard |= bitboard >> 8
+    bitboard |= bitboard >> 16
+    bitboard |= bitboard >> 32
+    return bitboard
+
+
+def file_fill(bitboard: int) -> int:
+    return north_fill(bitboard) | south_fill(bitboard)
+
+
+def east(bitboard: int) -> int:
+    return (bitboard << 1) & NOT_A_FILE
+
+
+def west(bitboard: int) -> int:
+    return (bitboard >> 1) & NOT_H_FILE
+
+
+def forward(bitboard: int, colour: Colour) -> int:
+    '''
+        The bitboard moved one rank towards the side of the board colour's pawns promote on
+    '''
+    if colour == Colour.WHITE:
+        return (bitboard << 8) & FULL_BITBOARD
+    return bitboard >> 8
+
+
+def front_span(pawns: int, colour: Colour) -> int:
+    '''
+        Every square in front of the pawns of a colour, on their own files
+    '''
+    if colour == Colour.WHITE:
+        return north_fill(forward(pawns, colour))
+    return south_fill(forward(pawns, colour))
+
+
+def pawn_attacks(pawns: int, colour: Colour) -> int:
+    ahead = forward(pawns, colour)
+    return east(ahead) | west(ahead)
+
+
+def _colour_terms(pawns: int, enemy_pawns: int, colour: Colour) -> tuple[int, int, int]:
+    '''
+        (middlegame score, endgame score, passed pawns) of the pawns of one colour
+    '''
+    mg_score = 0
+    eg_score = 0
+    enemy = colour.opposite
+
+    # Pawns with another of our pawns in front of them. Only the ones behind are counted, so a
+    # pair of doubled pawns is penalised once
+    doubled = (pawns & front_span(pawns, enemy)).bit_count()
+    files = file_fill(pawns)
+    isolated = (pawns & ~(east(files) | west(files))).bit_count()
+
+    # Pawns whose stop square, the one in front of them, is attacked by an enemy pawn and can't be
+    # defended by one of ours, as none of ours on the neighbouring files are level or behind
+    attacks = pawn_attacks(pawns, colour)
+    backward_stops = forward(pawns, colour) & pawn_attacks(enemy_pawns, enemy) & ~(attacks | front_span(attacks, colour))
+    backward_count = (forward(backward_stops, enemy) & pawns).bit_count()
+
+    mg_score -= doubled * DOUBLED_PENALTY[0] + isolated * ISOLATED_PENALTY[0] + backward_count * BACKWARD_PENALTY[0]
+    eg_score -= doubled * DOUBLED_PENALTY[1] + isolated * ISOLATED_PENALTY[1] + backward_count * BACKWARD_PENALTY[1]
+
+    # Passed pawns have no enemy pawns in front of them, on their file or the neighbouring ones
+    enemy_span = front_span(enemy_pawns, enemy)
+    passed = pawns & ~(enemy_span | east(enemy_span) | west(enemy_span))
+    for rank in Rank:
+        count = (passed & RANKS[rank]).bit_count()
+        if count:
+            relative_rank = rank if colour == Colour.WHITE else 7 - rank
+            mg_score += count * PASSED_BONUS[relative_rank][0]
+            eg_score += count * PASSED_BONUS[relative_rank][1]
+
+    return mg_score, eg_score, passed
+
+
+def evaluate_pawns(board: "Board") -> tuple[int, int, int, int]:
+    '''
+        Computes the pawn structure from scratch, as (middlegame score, endgame score, white passed
+        pawns, black passed pawns)
+    '''
+    white_pawns = int(board.bitboards[Colour.WHITE][Piece.PAWN])
+    black_pawns = int(board.bitboards[Colour.BLACK][Piece.PAWN])
+    white_mg, white_eg, white_passed = _colour_terms(white_pawns, black_pawns, Colour.WHITE)
+    black_mg, black_eg, black_passed = _colour_terms(black_pawns, white_pawns, Colour.BLACK)
+
+    return white_mg - black_mg, white_eg - black_eg, white_passed, black_passed
+
+
+def king_shield(board: "Board") -> int:
+    '''
+        Middlegame pawn shield score from white's point of view. It depends on where the kings are,
+        so it isn't part of the cached pawn structure, but it is only a few bit operations
+    '''
+    score = 0
+    for colour in Colour:
+        ahead = forward(int(board.bitboards[colour][Piece.KING]), colour)
+        ahead |= forward(ahead, colour)
+        count = (int(board.bitboards[colour][Piece.PAWN]) & (ahead | east(ahead) | west(ahead))).bit_count()
+        score += count * SHIELD_BONUS if colour == Colour.WHITE else -count * SHIELD_BONUS
+
+    return score
+
+
+class PawnHashTable:
+    '''
+        Direct mapped cache of evaluate_pawns, indexed by the low bits of the pawn key, with the full
+        key kept to verify a probe. Each entry takes 32 bytes, in four preallocated arrays
+    '''
+    def __init__(self, size_kb: int = 512):
+        num_entries = 1
+        while num_entries * 2 * 32 <= size_kb * 1024:
+            num_entries *= 2
+        self.mask = num_entries - 1
+        self.num_entries = num_entries
+
+        self.keys = array('Q', bytes(8 * num_entries))
+        # Middlegame score in the high 32 bits and endgame score in the low 32, both offset to be unsigned
+        self.scores = array('Q', bytes(8 * num_entries))
+        self.white_passed = array('Q', bytes(8 * num_entries))
+        self.black_passed = array('Q', bytes(8 * num_entries))
+        self.hits = 0
+        self.misses = 0
+
+
+    def clear(self):
+        self.keys = array('Q', bytes(8 * self.num_entries))
+        self.hits = 0
+        self.misses = 0
+
+
+    def hit_rate(self) -> float:
+        return self.hits / max(self.hits + self.misses, 1)
+
+
+    def probe(self, board: "Board") -> tuple[int, int, int, int]:
+        '''
+            evaluate_pawns, from the table if the position's pawns have been seen before
+        '''
+        key = board.pawn_key
+        index = key & self.mask
+        # A zero key can't be told apart from an empty entry, so it always misses
+        if key and self.keys[index] == key:
+            self.hits += 1
+            scores = self.scores[index]
+            return (scores >> 32) - (1 << 31), (scores & 0xFFFFFFFF) - (1 << 31), self.white_passed[index], self.black_passed[index]
+
+        self.misses += 1
+        mg_score, eg_score, white_passed, black_passed = evaluate_pawns(board)
+        self.keys[index] = key
+        self.scores[index] = (mg_score + (1 << 31)) << 32 | (eg_score + (1 << 31))
+        self.white_passed[index] = white_passed
+        self.black_passed[index] = black_passed
+
+        return mg_score, eg_score, white_passed, black_passed
@@ -0,0 +1,315 @@
+import argparse
+import os
+import sys
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from board import Board
+from int_board import IntBoard
+from move_generator import MoveGenerator
+from move_stack import MoveStack
+from move import move_to_string
+from constants import START_FEN, MAX_PLY
+
+'''
+    Perft counts the leaf nodes of the legal move tree to a fixed depth. The counts for standard
+    positions are well known, so any difference points to a move generation bug, and the time taken
+    measures the speed of move generation and make/unmake.
+    https://www.chessprogramming.org/Perft_Results
+'''
+
+# (name, fen, expected node counts starting from depth 1)
+PERFT_SUITE = [
+    ("Start position", START_FEN,
+     [20, 400, 8902, 197281, 4865609, 119060324]),
+    ("Kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     [48, 2039, 97862, 4085603, 193690690]),
+    ("Position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     [14, 191, 2812, 43238, 674624, 11030083]),
+    ("Position 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     [6, 264, 9467, 422333, 15833292]),
+    ("Position 4 mirrored", "r2q1rk1/pP1p2pp/Q4n2/bbp1p3/Np6/1B3NBn/pPPP1PPP/R3K2R b KQ - 0 1",
+     [6, 264, 9467, 422333, 15833292]),
+    ("Position 5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     [44, 1486, 62379, 2103487, 89941194]),
+    ("Position 6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     [46, 2079, 89890, 3894594, 164075551]),
+]
+
+
+class PerftCache:
+    '''
+        Fixed size table of (zobrist key, depth) -> node count, so a subtree reached again through a
+        transposition is only counted once. Each bucket has two entries: the first keeps the deepest
+        subtree seen, as it saves the most work, and the second always takes the latest count.
+        
+        keys[i] holds the zobrist key mixed with the depth, and counts[i] holds count << 8 | depth
+    '''
+    def __init__(self, size_mb: int = 16):
+        num_buckets = 1
+        while num_buckets * 2 * 2 * 16 <= size_mb * 1024 * 1024:
+            num_buckets *= 2
+        self.bucket_mask = num_buckets - 1
+        self.keys = array('Q', bytes(8 * 2 * num_buckets))
+        self.counts = array('Q', bytes(8 * 2 * num_buckets))
+        
+        self.hits = 0
+        self.misses = 0
+        
+        
+    def _mix(self, key: int, depth: int) -> int:
+        # Spreads the depth over every bit, so the same position at different depths lands in different buckets
+        return (key ^ (depth * 0x9E3779B97F4A7C15)) & 0xFFFFFFFFFFFFFFFF
+    
+    
+    def probe(self, key: int, depth: int) -> int | None:
+        mixed_key = self._mix(key, depth)
+        index = (mixed_key & self.bucket_mask) * 2
+        for slot in (index, index + 1):
+            if self.keys[slot] == mixed_key and self.counts[slot] & 0xFF == depth:
+                self.hits += 1
+                return self.counts[slot] >> 8
+        
+        self.misses += 1
+        return None
+    
+    
+    def store(self, key: int, depth: int, nodes: int):
+        mixed_key = self._mix(key, depth)
+        index = (mixed_key & self.bucket_mask) * 2
+        if depth < self.counts[index] & 0xFF:
+            index += 1
+        self.keys[index] = mixed_key
+        self.counts[index] = nodes << 8 | depth
+
+
+def perft(board: Board, move_generator: MoveGenerator, depth: int, cache: PerftCache | None = None, stack: MoveStack | None = None) -> int:
+    if stack is None:
+        stack = MoveStack(min(depth + 1, MAX_PLY))
+        
+    return _perft(board, move_generator, depth, cache, stack, 0)
+
+
+def _perft(board: Board, move_generator: MoveGenerator, depth: int, cache: PerftCache | None, stack: MoveStack, ply: int) -> int:
+    if depth == 0:
+        return 1
+    
+    if cache is not None:
+        nodes = cache.probe(board.zobrist_key, depth)
+        if nodes is not None:
+            return nodes
+    
+    count = stack.generate(board, move_generator, ply)
+    # Leaf moves don't need to be played, only counted
+    if depth == 1:
+        nodes = count
+    else:
+        nodes = 0
+        moves = stack.moves
+        start = stack.start(ply)
+        for index in range(start, start + count):
+            board.make_move(moves[index])
+            nodes += _perft(board, move_generator, depth - 1, cache, stack, ply + 1)
+            board.unmake_move()
+    
+    if cache is not None:
+        cache.store(board.zobrist_key, depth, nodes)
+        
+    return nodes
+
+
+def divide(board: Board, move_generator: MoveGenerator, depth: int, cache: PerftCache | None = None) -> dict[int, int]:
+    '''
+        Perft split by root move, for finding which move a wrong count comes from
+    '''
+    counts = {}
+    stack = MoveStack(min(depth, MAX_PLY))
+    for move in move_generator.get_legal_moves(board, board.side_to_move):
+        board.make_move(move)
+        counts[move] = perft(board, move_generator, depth - 1, cache, stack)
+        board.unmake_move()
+        
+    return counts
+
+
+# Each worker process builds its own board, move generator and cache once, in _init_worker
+_worker_board_type = None
+_worker_move_generator = None
+_worker_cache = None
+
+
+def _init_worker(board_type: type, cache_mb: int = 0, table_cache: str | None = None):
+    global _worker_board_type, _worker_move_generator, _worker_cache
+    _worker_board_type = board_type
+    _worker_move_generator = MoveGenerator(table_cache)
+    _worker_cache = PerftCache(cache_mb) if cache_mb > 0 else None
+
+
+def _perft_task(fen: str, moves: list[int], depth: int) -> tuple[int, int, float, int]:
+    '''
+        Runs perft after playing moves from the position. Returns the root move the count belongs to,
+        the count, the time taken and the worker's pid
+    '''
+    start = time.perf_counter()
+    board = _worker_board_type.from_fen(fen)
+    for move in moves:
+        board.make_move(move)
+    nodes = perft(board, _worker_move_generator, depth, _worker_cache)
+    
+    return moves[0], nodes, time.perf_counter() - start, os.getpid()
+
+
+def parallel_divide(fen: str, depth: int, workers: int | None = None, split_depth: int = 1, board_type: type = IntBoard, executor: ProcessPoolExecutor | None = None, cache_mb: int = 0, table_cache: str | None = None) -> tuple[dict[int, int], dict[int, tuple[int, float]]]:
+    '''
+        Divide, with the tree split across a process pool. The tree is split split_depth plies below
+        the root, so with a split depth of 2 every reply to every root move is a separate task, which
+        balances the load better when there are few root moves. The per task counts are merged back
+        into counts for each root move. With cache_mb set, every worker keeps its own perft cache.
+        With table_cache set, workers memory map the move generator's tables from that file.
+        
+        Returns the divide counts, and the (nodes, busy seconds) of each worker keyed by pid
+    '''
+    split_depth = max(1, min(split_depth, depth - 1))
+    board = board_type.from_fen(fen)
+    move_generator = MoveGenerator(table_cache)
+    counts = {}
+    
+    # Move sequences of length split_depth from the root. Lines ending in mate or stalemate before
+    # that have no nodes at the full depth, so they are dropped
+    tasks = []
+    def collect(moves: list[int], remaining: int):
+        if remaining == 0:
+            tasks.append(list(moves))
+            return
+        for move in move_generator.get_legal_moves(board, board.side_to_move):
+            board.make_move(move)
+            moves.append(move)
+            collect(moves, remaining - 1)
+            moves.pop()
+            board.unmake_move()
+    
+    for move in move_generator.get_legal_moves(board, board.side_to_move):
+        counts[move] = 0
+        board.make_move(move)
+        collect([move], split_depth - 1)
+        board.unmake_move()
+    
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(board_type, cache_mb, table_cache))
+    
+    worker_stats = {}
+    try:
+        futures = [executor.submit(_perft_task, fen, moves, depth - len(moves)) for moves in tasks]
+        for future in as_completed(futures):
+            root_move, nodes, elapsed, pid = future.result()
+            counts[root_move] += nodes
+            worker_nodes, worker_time = worker_stats.get(pid, (0, 0.0))
+            worker_stats[pid] = (worker_nodes + nodes, worker_time + elapsed)
+    finally:
+        if own_executor:
+            executor.shutdown()
+    
+    return counts, worker_stats
+
+
+def print_worker_stats(worker_stats: dict[int, tuple[int, float]]):
+    for pid, (nodes, elapsed) in sorted(worker_stats.items()):
+        print(f"  worker {pid:>7}  {nodes:>10} nodes  {elapsed:8.3f}s busy  {nodes / max(elapsed, 1e-9):>10.0f} nps")
+
+
+def run_suite(max_depth: int, board_type: type = IntBoard, workers: int = 1, split_depth: int = 1, cache_mb: int = 0, table_cache: str | None = None) -> bool:
+    '''
+        Runs every suite position up to max_depth, printing the count, time and nodes/sec of each.
+        With more than one worker, each count is split across a process pool, and the nodes and busy
+        time of each worker over the whole suite are printed at the end. A cache size of 0
+        disables the perft cache, which keeps the nps a pure move generation benchmark.
+        Returns whether every count matched
+    '''
+    move_generator = MoveGenerator(table_cache)
+    cache = PerftCache(cache_mb) if cache_mb > 0 else None
+    executor = None
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(board_type, cache_mb, table_cache))
+    all_passed = True
+    total_nodes = 0
+    total_time = 0.0
+    # Nodes and busy seconds of each worker, summed over every parallel count
+    worker_totals = {}
+    
+    for name, fen, expected_counts in PERFT_SUITE:
+        board = board_type.from_fen(fen)
+        for depth in range(1, min(max_depth, len(expected_counts)) + 1):
+            start = time.perf_counter()
+            if executor is not None and depth > 1:
+                counts, worker_stats = parallel_divide(fen, depth, split_depth=split_depth, board_type=board_type, executor=executor)
+                nodes = sum(counts.values())
+                for pid, (worker_nodes, busy) in worker_stats.items():
+                    total_worker_nodes, total_busy = worker_totals.get(pid, (0, 0.0))
+                    worker_totals[pid] = (total_worker_nodes + worker_nodes, total_busy + busy)
+            else:
+                nodes = perft(board, move_generator, depth, cache)
+            elapsed = time.perf_counter() - start
+            total_nodes += nodes
+            total_time += elapsed
+            
+            passed = nodes == expected_counts[depth - 1]
+            all_passed = all_passed and passed
+            print(f"{name:<20} depth {depth}  {nodes:>10} nodes  {elapsed:8.3f}s  {nodes / max(elapsed, 1e-9):>10.0f} nps  {'OK' if passed else 'FAIL, expected ' + str(expected_counts[depth - 1])}")
+    
+    print(f"Total {total_nodes} nodes in {total_time:.3f}s, {total_nodes / max(total_time, 1e-9):.0f} nps")
+    print_worker_stats(worker_totals)
+    if executor is not None:
+        executor.shutdown()
+    return all_passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perft move generation benchmark and correctness check")
+    parser.add_argument("depth", type=int, nargs="?", default=3)
+    parser.add_argument("--fen", default=None, help="Position to run, instead of the standard suite")
+    parser.add_argument("--divide", action="store_true", help="Print the node count of each root move")
+    parser.add_argument("--numpy-board", action="store_true", help="Use the numpy Board instead of IntBoard")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes to split the tree across")
+    parser.add_argument("--split-depth", type=int, default=1, help="Plies below the root to split the tree into tasks at")
+    parser.add_argument("--hash", type=int, default=0, help="Size in MB of the perft cache for transposed subtrees, 0 to disable")
+    parser.add_argument("--table-cache", default=None, help="File to load the move generator's tables from, written if missing")
+    args = parser.parse_args()
+    
+    board_type = Board if args.numpy_board else IntBoard
+    
+    if args.fen is None:
+        sys.exit(0 if run_suite(args.depth, board_type, args.workers, args.split_depth, args.hash, args.table_cache) else 1)
+    
+    board = board_type.from_fen(args.fen)
+    move_generator = MoveGenerator(args.table_cache)
+    parallel = args.workers > 1 and args.depth > 1
+    # With workers, each of them keeps its own cache, so the main process doesn't need one
+    cache = PerftCache(args.hash) if args.hash > 0 and not parallel else None
+    start = time.perf_counter()
+    worker_stats = None
+    if parallel:
+        counts, worker_stats = parallel_divide(args.fen, args.depth, args.workers, args.split_depth, board_type, cache_mb=args.hash, table_cache=args.table_cache)
+        nodes = sum(counts.values())
+        if args.divide:
+            for move, count in sorted(counts.items(), key=lambda item: move_to_string(item[0])):
+                print(f"{move_to_string(move)}: {count}")
+    elif args.divide:
+        counts = divide(board, move_generator, args.depth, cache)
+        for move, count in sorted(counts.items(), key=lambda item: move_to_string(item[0])):
+            print(f"{move_to_string(move)}: {count}")
+        nodes = sum(counts.values())
+    else:
+        nodes = perft(board, move_generator, args.depth, cache)
+    elapsed = time.perf_counter() - start
+    
+    print(f"Nodes: {nodes}")
+    print(f"Time: {elapsed:.3f}s, {nodes / max(elapsed, 1e-9):.0f} nps")
+    if worker_stats is not None:
+        print_worker_stats(worker_stats)
+    if cache is not None:
+        print(f"Cache: {cache.hits} hits, {cache.misses} misses")
+
+
+if __name__ == "__main__":
+    main()
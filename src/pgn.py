@@ -0,0 +1,282 @@
+import argparse
+import re
+import time
+import numpy as np
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator
+from constants import Piece, MoveFlags
+from board import Board, PIECES_BY_CHAR
+from int_board import IntBoard
+from move_generator import MoveGenerator
+
+'''
+    Reading and replaying PGN games. An archive is split into the raw text of each game a line at a
+    time, so it is never held in memory as a whole, and each game is then tokenised and its SAN moves
+    resolved against the legal moves of the position they are played in.
+
+    Replaying is the slow part, so replay_archive hands games to a process pool in chunks, while the
+    main process only splits the file into games. Only a few chunks are in flight at once, so memory
+    stays bounded however large the archive is.
+'''
+
+# Comments, NAGs, variation brackets, move numbers, results, and anything else is a move
+TOKEN_RE = re.compile(r"\{[^}]*\}?|;[^\n]*|\$\d+|[()]|1-0|0-1|1/2-1/2|\*|\d+\.+|[^\s{}();$]+")
+TAG_RE = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+# Piece, source file, source rank, target square and promotion piece of a SAN move
+SAN_RE = re.compile(r"^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$")
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+
+
+class PgnGame:
+    __slots__ = ("tags", "moves", "result")
+
+    def __init__(self, tags: dict[str, str], moves: list[str], result: str):
+        self.tags = tags
+        # Moves of the main line in SAN, without variations, comments or annotations
+        self.moves = moves
+        self.result = result
+
+
+class ReplayedGame:
+    __slots__ = ("tags", "moves", "keys", "error")
+
+    def __init__(self, tags: dict[str, str], moves: np.ndarray, keys: np.ndarray, error: str | None = None):
+        self.tags = tags
+        # 16 bit encoded moves, as played
+        self.moves = moves
+        # Zobrist key of the starting position and of the position after each move, so one longer than moves
+        self.keys = keys
+        # Why the game couldn't be replayed to the end, with moves and keys holding what was replayed
+        self.error = error
+
+
+def read_game_texts(lines: Iterable[str]) -> Iterator[str]:
+    '''
+        Splits the lines of a PGN archive into the text of each game. A game ends where the tags of
+        the next one start, so a tag line after movetext starts a new game, unless it is inside a
+        comment spanning several lines
+    '''
+    game_lines = []
+    in_movetext = False
+    in_comment = False
+    for line in lines:
+        if not in_comment and line.startswith("[") and in_movetext:
+            yield "".join(game_lines)
+            game_lines = []
+            in_movetext = False
+
+        game_lines.append(line)
+        if not in_comment and (line.startswith("[") or line.startswith("%") or not line.strip()):
+            continue
+        in_movetext = True
+        # Brace comments can't be nested, so the last brace on the line decides whether one is open
+        opened = line.rfind("{")
+        closed = line.rfind("}")
+        if opened != closed:
+            in_comment = opened > closed
+
+    if in_movetext:
+        yield "".join(game_lines)
+
+
+def tokenize_movetext(text: str) -> Iterator[str]:
+    '''
+        Yields the SAN moves of the main line, and the result if there is one. Comments, NAGs and
+        move numbers are dropped, along with everything inside variations
+    '''
+    variation_depth = 0
+    for token in TOKEN_RE.findall(text):
+        first = token[0]
+        if first == "(":
+            variation_depth += 1
+        elif first == ")":
+            variation_depth = max(variation_depth - 1, 0)
+        elif variation_depth or first in "{;$" or token[-1] == ".":
+            continue
+        else:
+            yield token
+
+
+def parse_game(text: str) -> PgnGame:
+    tags = {}
+    movetext = []
+    # Tags are only read before the movetext, as a line starting with [ after it is inside a comment
+    for line in text.splitlines():
+        if movetext:
+            movetext.append(line)
+        elif line.startswith("["):
+            match = TAG_RE.match(line)
+            if match:
+                tags[match.group(1)] = match.group(2).replace('\\"', '"').replace("\\\\", "\\")
+        elif line.strip() and not line.startswith("%"):
+            movetext.append(line)
+
+    moves = []
+    result = tags.get("Result", "*")
+    for token in tokenize_movetext("\n".join(movetext)):
+        if token in RESULTS:
+            result = token
+            break
+        moves.append(token)
+
+    return PgnGame(tags, moves, result)
+
+
+def read_games(path: str) -> Iterator[PgnGame]:
+    with open(path, encoding="utf-8", errors="replace") as file:
+        for text in read_game_texts(file):
+            yield parse_game(text)
+
+
+def san_to_move(board: Board, move_generator: MoveGenerator, san: str) -> int:
+    '''
+        Finds the legal move of the side to move which a SAN move describes. Raises ValueError if the
+        SAN doesn't describe exactly one legal move
+    '''
+    san = san.rstrip("+#!?")
+    legal_moves = move_generator.get_legal_moves(board, board.side_to_move)
+    if san in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        flag = MoveFlags.KING_CASTLE if len(san) == 3 else MoveFlags.QUEEN_CASTLE
+        for move in legal_moves:
+            if move >> 12 == flag:
+                return move
+        raise ValueError(f"illegal castling move {san}")
+
+    match = SAN_RE.match(san)
+    if match is None:
+        raise ValueError(f"can't parse move {san}")
+    piece_char, source_file, source_rank, target, promotion_char = match.groups()
+    piece = PIECES_BY_CHAR[piece_char.lower()] if piece_char else Piece.PAWN
+    target_square = (int(target[1]) - 1) * 8 + ord(target[0]) - ord("a")
+    promotion = PIECES_BY_CHAR[promotion_char.lower()] if promotion_char else None
+
+    mailbox = board.mailbox
+    candidates = []
+    for move in legal_moves:
+        source = move & 0x3F
+        if (move >> 6) & 0x3F != target_square or mailbox[source] & 0b111 != piece:
+            continue
+        if source_file is not None and source % 8 != ord(source_file) - ord("a"):
+            continue
+        if source_rank is not None and source // 8 != int(source_rank) - 1:
+            continue
+        flag = move >> 12
+        if flag & MoveFlags.KNIGHT_PROMOTION:
+            if promotion is None or Piece.KNIGHT + (flag & 0b11) != promotion:
+                continue
+        elif promotion is not None:
+            continue
+        candidates.append(move)
+
+    if len(candidates) != 1:
+        raise ValueError(f"{'ambiguous' if candidates else 'illegal'} move {san}")
+    return candidates[0]
+
+
+def replay_game(game: PgnGame, move_generator: MoveGenerator, board_type: type[Board] = IntBoard) -> ReplayedGame:
+    '''
+        Plays through the moves of a game from its starting position, which is the FEN tag if it has one
+    '''
+    board = board_type.from_fen(game.tags["FEN"]) if "FEN" in game.tags else board_type()
+    moves = array('H')
+    keys = array('Q', [board.zobrist_key])
+    error = None
+    for san in game.moves:
+        try:
+            move = san_to_move(board, move_generator, san)
+        except ValueError as exception:
+            error = f"ply {len(moves) + 1}: {exception}"
+            break
+        board.make_move(move)
+        moves.append(move)
+        keys.append(board.zobrist_key)
+
+    return ReplayedGame(game.tags, np.frombuffer(moves, dtype=np.uint16), np.frombuffer(keys, dtype=np.uint64), error)
+
+
+# Each worker process builds its own move generator once, in _init_worker
+_worker_board_type = None
+_worker_move_generator = None
+
+
+def _init_worker(board_type: type, table_cache: str | None = None):
+    global _worker_board_type, _worker_move_generator
+    _worker_board_type = board_type
+    _worker_move_generator = MoveGenerator(table_cache)
+
+
+def _replay_chunk(texts: list[str]) -> list[ReplayedGame]:
+    return [replay_game(parse_game(text), _worker_move_generator, _worker_board_type) for text in texts]
+
+
+def _chunks(items: Iterable[str], chunk_size: int) -> Iterator[list[str]]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def replay_archive(path: str, workers: int = 1, chunk_size: int = 256, board_type: type[Board] = IntBoard,
+                   table_cache: str | None = None, max_pending: int | None = None) -> Iterator[ReplayedGame]:
+    '''
+        Yields every game of a PGN archive replayed, in the order of the archive. With more than one
+        worker, chunks of games are replayed in a process pool, with at most max_pending chunks
+        submitted and not yet yielded, two per worker by default
+    '''
+    with open(path, encoding="utf-8", errors="replace") as file:
+        chunks = _chunks(read_game_texts(file), chunk_size)
+        if workers <= 1:
+            _init_worker(board_type, table_cache)
+            for chunk in chunks:
+                yield from _replay_chunk(chunk)
+            return
+
+        max_pending = max_pending or 2 * workers
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(board_type, table_cache))
+        pending = deque()
+        try:
+            for chunk in chunks:
+                pending.append(executor.submit(_replay_chunk, chunk))
+                if len(pending) >= max_pending:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay every game of a PGN archive and report how fast they were replayed")
+    parser.add_argument("path")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes to replay games in")
+    parser.add_argument("--chunk-size", type=int, default=256, help="Games sent to a worker at a time")
+    parser.add_argument("--report-interval", type=int, default=10000, help="Games between progress reports")
+    parser.add_argument("--table-cache", default=None, help="File to load the move generator's tables from, written if missing")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    games = 0
+    plies = 0
+    errors = 0
+    for game in replay_archive(args.path, args.workers, args.chunk_size, table_cache=args.table_cache):
+        games += 1
+        plies += len(game.moves)
+        if game.error is not None:
+            errors += 1
+        if games % args.report_interval == 0:
+            elapsed = time.perf_counter() - start
+            print(f"{games} games, {plies} plies in {elapsed:.1f}s, {games / max(elapsed, 1e-9):.0f} games/s")
+
+    elapsed = time.perf_counter() - start
+    print(f"Replayed {games} games, {plies} plies in {elapsed:.3f}s, {games / max(elapsed, 1e-9):.0f} games/s, "
+          f"{plies / max(elapsed, 1e-9):.0f} plies/s, {errors} games with errors")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import argparse
+import numpy as np
+from typing import Iterable
+from constants import Piece, Colour
+from board import Board, EMPTY_SQUARE
+from int_board import IntBoard
+from board_batch import BoardBatch, SQUARE_BITS
+from epd import read_boards
+
+'''
+    Fixed width binary records of positions, 31 bytes each against around 60 for a FEN:
+    occupancy       64 bit bitboard of every occupied square
+    pieces          4 bits for each occupied square, in order of square, two to a byte with the
+                    first in the low nibble. Each holds (colour << 3) | piece, as the mailbox does
+    side_to_move, castling_rights, ep_target, halfmove_clock
+    score           optional, in centipawns from white's point of view, NO_SCORE when unknown
+    result          optional, 1 for a white win, 0 for a draw, -1 for a black win, NO_RESULT when unknown
+
+    A file is a short header followed by the records, so it can be memory mapped as a numpy array and
+    any record read or sliced out without reading the rest of the file.
+'''
+
+POSITION_DTYPE = np.dtype([
+    ("occupancy", "<u8"),
+    ("pieces", "u1", (16,)),
+    ("side_to_move", "u1"),
+    ("castling_rights", "u1"),
+    ("ep_target", "i1"),
+    ("halfmove_clock", "u1"),
+    ("score", "<i2"),
+    ("result", "i1"),
+])
+NO_SCORE = -(1 << 15)
+NO_RESULT = -128
+
+# Identifies the file format and its version, in case the record layout changes
+HEADER = b"CHESPOS1"
+HEADER_SIZE = len(HEADER)
+
+
+def pack_board(board: Board, score: int = NO_SCORE, result: int = NO_RESULT, record: np.void | None = None) -> np.void:
+    '''
+        Packs a position into a record, written into the one given if there is one
+    '''
+    if record is None:
+        record = np.zeros(1, dtype=POSITION_DTYPE)[0]
+
+    occupancy = board.get_occupancy()
+    mailbox = board.mailbox
+    pieces = bytearray(16)
+    bitboard = occupancy
+    index = 0
+    while bitboard:
+        square = (bitboard & -bitboard).bit_length() - 1
+        bitboard &= bitboard - 1
+        pieces[index >> 1] |= mailbox[square] << (4 * (index & 1))
+        index += 1
+
+    record["occupancy"] = occupancy
+    record["pieces"] = np.frombuffer(pieces, dtype=np.uint8)
+    record["side_to_move"] = board.side_to_move
+    record["castling_rights"] = board.castling_rights
+    record["ep_target"] = board.ep_target
+    record["halfmove_clock"] = min(board.halfmove_clock, 0xFF)
+    record["score"] = score
+    record["result"] = result
+
+    return record
+
+
+def pack_boards(boards: Iterable[Board]) -> np.ndarray:
+    boards = list(boards)
+    records = np.zeros(len(boards), dtype=POSITION_DTYPE)
+    for index, board in enumerate(boards):
+        pack_board(board, record=records[index])
+
+    return records
+
+
+def unpack_board(record: np.void, board_type: type[Board] = IntBoard, board: Board | None = None) -> Board:
+    '''
+        Sets up a board from a record, reusing the board given if there is one
+    '''
+    if board is None:
+        board = board_type()
+
+    bitboards = [[0] * len(Piece) for _ in Colour]
+    pieces = record["pieces"].tobytes()
+    bitboard = int(record["occupancy"])
+    index = 0
+    while bitboard:
+        square_bit = bitboard & -bitboard
+        bitboard ^= square_bit
+        code = (pieces[index >> 1] >> (4 * (index & 1))) & 0xF
+        bitboards[code >> 3][code & 0b111] |= square_bit
+        index += 1
+
+    for colour in Colour:
+        for piece in Piece:
+            board.bitboards[colour][piece] = bitboards[colour][piece]
+    board.side_to_move = Colour(int(record["side_to_move"]))
+    board.castling_rights = int(record["castling_rights"])
+    board.ep_target = int(record["ep_target"])
+    board.halfmove_clock = int(record["halfmove_clock"])
+    board.fullmove_number = 1
+    board.history = []
+    board.refresh()
+
+    return board
+
+
+def unpack_batch(records: np.ndarray) -> BoardBatch:
+    '''
+        Unpacks many records at once into a BoardBatch. Each piece's index among the occupied squares
+        is found by a running count of the occupancy bits, which picks out its nibble, and each of
+        the twelve bitboards is then a reduction over the squares holding its code
+    '''
+    batch = BoardBatch(len(records))
+    occupied = (records["occupancy"][:, None] & SQUARE_BITS) != 0
+    index = np.cumsum(occupied, axis=1) - 1
+    index[~occupied] = 0
+    nibbles = (np.take_along_axis(records["pieces"], index >> 1, axis=1) >> ((index & 1) * 4)) & 0xF
+    codes = np.where(occupied, nibbles, EMPTY_SQUARE)
+
+    for colour in Colour:
+        for piece in Piece:
+            squares = np.where(codes == (colour << 3) | piece, SQUARE_BITS, np.uint64(0))
+            batch.bitboards[:, colour, piece] = np.bitwise_or.reduce(squares, axis=1)
+    batch.side_to_move[:] = records["side_to_move"]
+    batch.castling_rights[:] = records["castling_rights"]
+    batch.ep_target[:] = records["ep_target"]
+
+    return batch
+
+
+class PositionWriter:
+    '''
+        Appends records to a position file, a chunk at a time, so a file of any size can be written
+        without holding it in memory
+    '''
+    def __init__(self, path: str, chunk_size: int = 65536):
+        self.file = open(path, "wb")
+        self.file.write(HEADER)
+        self.chunk = np.zeros(chunk_size, dtype=POSITION_DTYPE)
+        self.count = 0
+        self.written = 0
+
+
+    def write(self, board: Board, score: int = NO_SCORE, result: int = NO_RESULT):
+        pack_board(board, score, result, self.chunk[self.count])
+        self.count += 1
+        if self.count == len(self.chunk):
+            self.flush()
+
+
+    def write_records(self, records: np.ndarray):
+        self.flush()
+        self.file.write(records.astype(POSITION_DTYPE, copy=False).tobytes())
+        self.written += len(records)
+
+
+    def flush(self):
+        self.file.write(self.chunk[:self.count].tobytes())
+        self.written += self.count
+        self.count = 0
+
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+    def __enter__(self) -> "PositionWriter":
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def open_positions(path: str, mode: str = "r") -> np.memmap:
+    '''
+        Memory maps a position file as an array of records. Slices of it are views of the file, and
+        records are only read from disk when they are used
+    '''
+    with open(path, "rb") as file:
+        if file.read(HEADER_SIZE) != HEADER:
+            raise ValueError(f"{path} is not a position file")
+
+    return np.memmap(path, dtype=POSITION_DTYPE, mode=mode, offset=HEADER_SIZE)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert an EPD file into a binary position file")
+    parser.add_argument("input")
+    parser.add_argument("output")
+    args = parser.parse_args()
+
+    with PositionWriter(args.output) as writer:
+        for board, _ in read_boards(args.input):
+            writer.write(board)
+    print(f"Wrote {writer.written} positions to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,13 +4,12 @@ from pathlib import Path
 from board import Board
 from move_generator import MoveGenerator
 from move import decode_flag, decode_source, decode_target
-from constants import GAME_HEIGHT, GAME_WIDTH, GAME_SQUARE_SIZE, Piece, Colour
+from constants import GAME_HEIGHT, GAME_WIDTH, GAME_SQUARE_SIZE, Piece, Colour, MoveFlags
 
 class Renderer:
     def __init__(self, board: Board, move_generator: MoveGenerator):
         self.board = board
         self.move_generator = move_generator
-        self.turn = Colour.WHITE
 
         pygame.init()
         self.screen = pygame.display.set_mode((GAME_WIDTH, GAME_HEIGHT))
@@ -47,19 +46,17 @@ class Renderer:
     
     def draw_pieces(self):
         active_piece_data = None
-        for colour in Colour:
-            for piece in Piece:
-                bitboard = self.board.bitboards[colour][piece]
-                if bitboard == 0: continue
-                
-                for square in range(64):
-                    if (bitboard >> np.uint64(square)) & np.uint64(1) == 1:
-                        if square == self.active_piece_index:
-                            # Saving information so the active piece has a higher z-index than other pieces
-                            # when it is drawn last
-                            active_piece_data = (colour, piece)
-                        else:
-                            self.draw_single_piece(square, colour, piece)
+        for square in range(64):
+            piece = self.board.get_piece_at(square)
+            if piece is None: continue
+            
+            colour = self.board.get_colour_at(square)
+            if square == self.active_piece_index:
+                # Saving information so the active piece has a higher z-index than other pieces
+                # when it is drawn last
+                active_piece_data = (colour, piece)
+            else:
+                self.draw_single_piece(square, colour, piece)
         
         if active_piece_data is not None and self.active_piece_index is not None:
             colour, piece = active_piece_data
@@ -83,10 +80,13 @@ class Renderer:
     
     
     def find_matching_move(self, start_sq, end_sq) -> np.int16 | None:
-        legal_moves = self.move_generator.get_legal_moves(self.board, self.turn)
+        legal_moves = self.move_generator.get_legal_moves(self.board, self.board.side_to_move)
         for move in legal_moves:
             source_sq = decode_source(move)
             target_sq = decode_target(move)
+            # We autoqueen for now, so underpromotions are skipped
+            if decode_flag(move) & MoveFlags.KNIGHT_PROMOTION and (decode_flag(move) & 0b11) != 0b11:
+                continue
             if source_sq == start_sq and target_sq == end_sq:
                 return move
                 
@@ -101,14 +101,14 @@ class Renderer:
                     return
                 elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
                     for square in range(64):
-                        if ((self.board.get_occupancy() >> np.uint64(square)) & np.uint64(1)) and self.pieces[square].collidepoint(event.pos):
+                        if self.board.get_piece_at(square) is not None and self.pieces[square].collidepoint(event.pos):
                             self.active_piece_index = square
                             break
                 elif event.type == pygame.MOUSEMOTION:
                     if self.active_piece_index is not None:
                         self.pieces[self.active_piece_index].move_ip(event.rel)
                 elif event.type == pygame.MOUSEBUTTONUP and event.button == 1:
-                    if self.active_piece_index is None or (self.board.get_colour_occupancy(self.turn) & (1 << self.active_piece_index) == 0):
+                    if self.active_piece_index is None or self.board.get_colour_at(self.active_piece_index) != self.board.side_to_move:
                         self.active_piece_index = None
                         continue
                     
@@ -121,9 +121,8 @@ class Renderer:
                         new_square_index = rank * 8 + col
                         matching_move = self.find_matching_move(self.active_piece_index, new_square_index)
                         print(matching_move)
-                        if matching_move and new_square_index != self.active_piece_index:
-                            self.board.make_move(self.active_piece_index, new_square_index)
-                            self.turn = self.turn.opposite
+                        if matching_move is not None and new_square_index != self.active_piece_index:
+                            self.board.make_move(matching_move)
                     
                     self.active_piece_index = None
                     
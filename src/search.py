@@ -0,0 +1,414 @@
+import argparse
+import time
+from typing import Callable
+from constants import Bound, MoveFlags, MAX_PLY
+from board import Board
+from int_board import IntBoard
+from move_generator import MoveGenerator
+from move_stack import MoveStack
+from move_picker import pick_moves
+from move import move_to_string
+from transposition_table import TranspositionTable
+from evaluation import evaluate
+from pawn_structure import PawnHashTable
+
+'''
+    Negamax alpha-beta search with iterative deepening. Each iteration searches one ply deeper than
+    the last, starting with a narrow aspiration window around the previous score, and the best
+    move found so far is always available if the search is stopped.
+
+    Principal variation search: the first move of a node is searched with the full window, and every
+    later move with a null window, just to prove it is no better. Only moves which fail that proof
+    are searched again with the full window.
+
+    At the horizon, a quiescence search plays out captures and promotions until the position is quiet,
+    so a position isn't scored in the middle of an exchange.
+'''
+
+INFINITY = 32000
+MATE_SCORE = 31000
+# Scores beyond this are mates, with the distance to mate in plies taken off MATE_SCORE
+MATE_BOUND = MATE_SCORE - MAX_PLY
+ASPIRATION_WINDOW = 25
+# How many nodes are searched between checks of the node and time limits
+CHECK_INTERVAL = 1024
+# How far back the history is searched for repetitions, in plies
+REPETITION_WINDOW = 100
+
+
+class SearchLimits:
+    '''
+        When to stop searching. Unset limits are ignored, and with none set the search runs to MAX_PLY
+        soft_time: seconds after which no new iteration is started
+        hard_time: seconds after which the search is stopped, even in the middle of an iteration
+    '''
+    __slots__ = ("depth", "nodes", "soft_time", "hard_time")
+
+    def __init__(self, depth: int | None = None, nodes: int | None = None, soft_time: float | None = None, hard_time: float | None = None):
+        self.depth = depth
+        self.nodes = nodes
+        self.soft_time = soft_time
+        self.hard_time = hard_time
+
+
+    @classmethod
+    def from_clock(cls, time_left: float, increment: float = 0.0, moves_to_go: int | None = None) -> "SearchLimits":
+        '''
+            Limits for a move played on a clock, all in seconds. The soft limit is an even share of the
+            time left plus most of the increment, and the hard limit lets a hard iteration run on to a
+            few times that, while never using more than half of the time left
+        '''
+        moves_to_go = moves_to_go or 30
+        soft_time = time_left / moves_to_go + increment * 0.75
+        hard_time = min(soft_time * 4, time_left / 2)
+
+        return cls(soft_time=min(soft_time, hard_time), hard_time=hard_time)
+
+
+class SearchReport:
+    '''
+        Progress of the search after a completed iteration
+    '''
+    __slots__ = ("depth", "seldepth", "score", "nodes", "time", "nps", "pv", "hashfull")
+
+    def __init__(self, depth: int, seldepth: int, score: int, nodes: int, time: float, pv: list[int], hashfull: int):
+        self.depth = depth
+        self.seldepth = seldepth
+        self.score = score
+        self.nodes = nodes
+        self.time = time
+        self.nps = int(nodes / max(time, 1e-9))
+        self.pv = pv
+        self.hashfull = hashfull
+
+
+    def score_string(self) -> str:
+        # Mates are given in moves rather than plies, negative when we are the side being mated
+        if self.score >= MATE_BOUND:
+            return f"mate {(MATE_SCORE - self.score + 1) // 2}"
+        if self.score <= -MATE_BOUND:
+            return f"mate {-(MATE_SCORE + self.score) // 2}"
+        return f"cp {self.score}"
+
+
+    def to_info_string(self) -> str:
+        '''
+            The report as a UCI info line
+        '''
+        return (f"info depth {self.depth} seldepth {self.seldepth} score {self.score_string()} nodes {self.nodes} "
+                f"nps {self.nps} hashfull {self.hashfull} time {int(self.time * 1000)} pv {' '.join(move_to_string(move) for move in self.pv)}")
+
+
+class Searcher:
+    def __init__(self, move_generator: MoveGenerator, transposition_table: TranspositionTable | None = None):
+        self.move_generator = move_generator
+        self.transposition_table = transposition_table if transposition_table is not None else TranspositionTable()
+        self.pawn_table = PawnHashTable()
+        self.stack = MoveStack()
+        # Two quiet moves for each ply which last caused a beta cutoff there
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        # Principal variation found from each ply, rebuilt as better moves are found
+        self.pv_table = [[] for _ in range(MAX_PLY + 1)]
+
+        self.limits = SearchLimits()
+        self.start_time = 0.0
+        # When the time limits are counted from, which is the start unless the limits were replaced
+        self.limit_start = 0.0
+        self.nodes = 0
+        self.seldepth = 0
+        self.stopped = False
+
+
+    def stop(self):
+        '''
+            Stops the search as soon as possible. Safe to call from another thread
+        '''
+        self.stopped = True
+
+
+    def set_limits(self, limits: SearchLimits):
+        '''
+            Replaces the limits of a running search, with its time counted from now rather than from
+            the start. Used when a ponder search becomes a real one
+        '''
+        self.limits = limits
+        self.limit_start = time.perf_counter()
+
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start_time
+
+
+    def limit_elapsed(self) -> float:
+        '''
+            Seconds counted against the time limits, which only differs from elapsed after set_limits
+        '''
+        return time.perf_counter() - self.limit_start
+
+
+    def search(self, board: Board, limits: SearchLimits, on_iteration: Callable[[SearchReport], None] | None = None,
+               reset_stop: bool = True) -> tuple[int, int]:
+        '''
+            Searches the position until a limit is reached or stop is called, and returns the best move
+            and its score. on_iteration is called with a report after every completed iteration.
+            A search started on another thread should clear stopped itself before starting the thread,
+            and pass reset_stop=False, so a stop which arrives before the search starts isn't lost
+        '''
+        self.limits = limits
+        self.start_time = time.perf_counter()
+        self.limit_start = self.start_time
+        self.nodes = 0
+        if reset_stop:
+            self.stopped = False
+        self.transposition_table.new_search()
+        for killers in self.killers:
+            killers[0] = killers[1] = 0
+
+        best_move = 0
+        score = 0
+        max_depth = min(limits.depth or MAX_PLY - 1, MAX_PLY - 1)
+        for depth in range(1, max_depth + 1):
+            self.seldepth = 0
+            window = ASPIRATION_WINDOW
+            if depth >= 4 and abs(score) < MATE_BOUND:
+                alpha, beta = score - window, score + window
+            else:
+                alpha, beta = -INFINITY, INFINITY
+
+            # The window is widened on the side the score fell outside of, until it lands inside
+            while True:
+                iteration_score = self._negamax(board, depth, alpha, beta, 0)
+                if self.stopped:
+                    break
+                if iteration_score <= alpha:
+                    alpha = max(iteration_score - window, -INFINITY)
+                elif iteration_score >= beta:
+                    beta = min(iteration_score + window, INFINITY)
+                else:
+                    break
+                window *= 2
+
+            # A partly searched iteration can't be trusted, so the last completed one is kept
+            if self.stopped:
+                break
+
+            score = iteration_score
+            pv = list(self.pv_table[0])
+            if pv:
+                best_move = pv[0]
+            if on_iteration is not None:
+                on_iteration(SearchReport(depth, self.seldepth, score, self.nodes, self.elapsed(), pv, self.transposition_table.hashfull()))
+
+            # The root always searches its moves, so a completed iteration without a principal variation
+            # means it has none, mate or stalemate, and searching deeper can't change that
+            if not pv:
+                break
+
+            if self.limits.soft_time is not None and self.limit_elapsed() >= self.limits.soft_time:
+                break
+
+        # Stopped before the first iteration finished, so any legal move will do
+        if best_move == 0:
+            moves = self.move_generator.get_legal_moves(board, board.side_to_move)
+            if moves:
+                best_move = moves[0]
+
+        return best_move, score
+
+
+    def _check_limits(self):
+        limits = self.limits
+        if limits.nodes is not None and self.nodes >= limits.nodes:
+            self.stopped = True
+        elif limits.hard_time is not None and self.limit_elapsed() >= limits.hard_time:
+            self.stopped = True
+
+
+    def _is_repetition(self, board: Board) -> bool:
+        # History entries hold the key from before each move, so the positions with the same side to
+        # move are every second entry back from the one before last
+        history = board.history
+        key = board.zobrist_key
+        for index in range(len(history) - 2, max(len(history) - REPETITION_WINDOW, 0) - 1, -2):
+            if history[index][5] == key:
+                return True
+
+        return False
+
+
+    def _negamax(self, board: Board, depth: int, alpha: int, beta: int, ply: int) -> int:
+        if depth <= 0:
+            return self._quiescence(board, alpha, beta, ply)
+
+        self.pv_table[ply] = []
+        self.nodes += 1
+        if self.nodes % CHECK_INTERVAL == 0:
+            self._check_limits()
+        if self.stopped:
+            return 0
+        if ply > self.seldepth:
+            self.seldepth = ply
+
+        if ply > 0 and self._is_repetition(board):
+            return 0
+        if ply >= MAX_PLY - 1:
+            return evaluate(board, self.pawn_table)
+
+        key = board.zobrist_key
+        hash_move = 0
+        entry = self.transposition_table.probe(key)
+        if entry is not None:
+            entry_depth, bound, entry_score, hash_move = entry
+            # The root always searches, so that it has a principal variation
+            if ply > 0 and entry_depth >= depth:
+                entry_score = score_from_table(entry_score, ply)
+                if bound == Bound.EXACT:
+                    return entry_score
+                if bound == Bound.LOWER and entry_score >= beta:
+                    return entry_score
+                if bound == Bound.UPPER and entry_score <= alpha:
+                    return entry_score
+
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_move = 0
+        move_count = 0
+        killers = self.killers[ply]
+        # Worked out once here, for both the move picker and the checkmate test
+        info = self.move_generator.get_position_info(board, board.side_to_move)
+        for move in pick_moves(board, self.move_generator, self.stack, ply, hash_move, killers, info=info):
+            move_count += 1
+            board.make_move(move)
+            if move_count == 1:
+                score = -self._negamax(board, depth - 1, -beta, -alpha, ply + 1)
+            else:
+                score = -self._negamax(board, depth - 1, -alpha - 1, -alpha, ply + 1)
+                if alpha < score < beta:
+                    score = -self._negamax(board, depth - 1, -beta, -alpha, ply + 1)
+            board.unmake_move()
+
+            if self.stopped:
+                return 0
+
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    self.pv_table[ply] = [move] + self.pv_table[ply + 1]
+                    if alpha >= beta:
+                        # Quiet moves which cut off are remembered as killers for this ply
+                        if not move >> 12 & (MoveFlags.CAPTURE | MoveFlags.KNIGHT_PROMOTION) and move != killers[0]:
+                            killers[1] = killers[0]
+                            killers[0] = move
+                        break
+
+        # No legal moves is checkmate if we are in check, otherwise stalemate. Mates closer to the
+        # root score higher, so the shortest mate is preferred
+        if move_count == 0:
+            if info.checkers:
+                return -MATE_SCORE + ply
+            return 0
+
+        if best_score <= original_alpha:
+            bound = Bound.UPPER
+        elif best_score >= beta:
+            bound = Bound.LOWER
+        else:
+            bound = Bound.EXACT
+        self.transposition_table.store(key, depth, bound, score_to_table(best_score, ply), best_move)
+
+        return best_score
+
+
+    def _quiescence(self, board: Board, alpha: int, beta: int, ply: int) -> int:
+        '''
+            Searches only captures and promotions which don't lose material. The side to move can
+            stand pat on the static evaluation instead of capturing, unless it is in check, where
+            every evasion is searched and having none is mate
+        '''
+        self.pv_table[ply] = []
+        self.nodes += 1
+        if self.nodes % CHECK_INTERVAL == 0:
+            self._check_limits()
+        if self.stopped:
+            return 0
+        if ply > self.seldepth:
+            self.seldepth = ply
+        if ply >= MAX_PLY - 1:
+            return evaluate(board, self.pawn_table)
+
+        info = self.move_generator.get_position_info(board, board.side_to_move)
+        in_check = bool(info.checkers)
+        if in_check:
+            best_score = -MATE_SCORE + ply
+        else:
+            best_score = evaluate(board, self.pawn_table)
+            if best_score >= beta:
+                return best_score
+            alpha = max(alpha, best_score)
+
+        for move in pick_moves(board, self.move_generator, self.stack, ply, quiets=in_check, info=info):
+            # Under promotions are left to the main search
+            if not in_check and move >> 12 & MoveFlags.KNIGHT_PROMOTION and move >> 12 & 0b11 != 0b11:
+                continue
+            board.make_move(move)
+            score = -self._quiescence(board, -beta, -alpha, ply + 1)
+            board.unmake_move()
+
+            if self.stopped:
+                return 0
+
+            if score > best_score:
+                best_score = score
+                if score > alpha:
+                    alpha = score
+                    self.pv_table[ply] = [move] + self.pv_table[ply + 1]
+                    if alpha >= beta:
+                        break
+
+        return best_score
+
+
+def score_to_table(score: int, ply: int) -> int:
+    '''
+        Mate scores are stored as the distance to mate from the stored position rather than from the
+        root, so they stay correct when the position is reached at another ply
+    '''
+    if score >= MATE_BOUND:
+        return score + ply
+    if score <= -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def score_from_table(score: int, ply: int) -> int:
+    if score >= MATE_BOUND:
+        return score - ply
+    if score <= -MATE_BOUND:
+        return score + ply
+    return score
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search a position and print the progress of each iteration")
+    parser.add_argument("--fen", default=None, help="Position to search, instead of the start position")
+    parser.add_argument("--depth", type=int, default=None)
+    parser.add_argument("--nodes", type=int, default=None)
+    parser.add_argument("--movetime", type=float, default=None, help="Seconds to search for")
+    parser.add_argument("--hash", type=int, default=16, help="Size in MB of the transposition table")
+    args = parser.parse_args()
+
+    board = IntBoard.from_fen(args.fen) if args.fen else IntBoard()
+    if args.depth is None and args.nodes is None and args.movetime is None:
+        args.depth = 5
+    limits = SearchLimits(depth=args.depth, nodes=args.nodes, soft_time=args.movetime, hard_time=args.movetime)
+
+    searcher = Searcher(MoveGenerator(), TranspositionTable(args.hash))
+    best_move, _ = searcher.search(board, limits, lambda report: print(report.to_info_string()))
+    # 0000 is the null move UCI uses when there is no legal move
+    print(f"bestmove {move_to_string(best_move) if best_move else '0000'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+from constants import Piece, Colour, MoveFlags
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from board import Board
+    from move_generator import MoveGenerator
+
+'''
+    Static exchange evaluation works out the material won or lost by a capture, assuming both sides
+    keep recapturing on the target square with their least valuable piece, and either side can stop
+    recapturing when it would lose material. No moves are played, only the occupancy is updated, and
+    sliders behind the pieces which have captured are found by looking up the attackers again.
+'''
+
+# The king is worth more than anything it could win, so capturing it always ends the exchange
+SEE_VALUES = [100, 320, 330, 500, 900, 20000]
+
+
+def see(board: "Board", move: int, move_generator: "MoveGenerator") -> int:
+    '''
+        Material gained by the side to move from the exchange started by move, in centipawns.
+        Negative when the move loses material, and 0 for castling and quiet moves to safe squares
+    '''
+    source = move & 0x3F
+    target = (move >> 6) & 0x3F
+    flag = move >> 12
+    if flag == MoveFlags.KING_CASTLE or flag == MoveFlags.QUEEN_CASTLE:
+        return 0
+
+    colour = board.side_to_move
+    bitboards = board.bitboards
+    occupancy = board.get_occupancy() ^ (1 << source)
+
+    # gains[i] is the material won by the side making capture i, if the exchange stops after it
+    gains = [0] * 32
+    if flag == MoveFlags.EP_CAPTURE:
+        gains[0] = SEE_VALUES[Piece.PAWN]
+        occupancy ^= 1 << (target - 8 if colour == Colour.WHITE else target + 8)
+    elif flag & MoveFlags.CAPTURE:
+        gains[0] = SEE_VALUES[board.mailbox[target] & 0b111]
+
+    piece_on_target = board.mailbox[source] & 0b111
+    if flag & MoveFlags.KNIGHT_PROMOTION:
+        piece_on_target = Piece.KNIGHT + (flag & 0b11)
+        gains[0] += SEE_VALUES[piece_on_target] - SEE_VALUES[Piece.PAWN]
+
+    # get_attackers gives the attackers of the opposite colour to the one passed in
+    king_attacks = move_generator._king_moves[target]
+    attackers = (
+        int(move_generator.get_attackers(board, Colour.BLACK, target, occupancy))
+        | int(move_generator.get_attackers(board, Colour.WHITE, target, occupancy))
+        | (king_attacks & (int(bitboards[Colour.WHITE][Piece.KING]) | int(bitboards[Colour.BLACK][Piece.KING])))
+    ) & occupancy
+    diagonal_sliders = 0
+    orthogonal_sliders = 0
+    for side in Colour:
+        queens = int(bitboards[side][Piece.QUEEN])
+        diagonal_sliders |= int(bitboards[side][Piece.BISHOP]) | queens
+        orthogonal_sliders |= int(bitboards[side][Piece.ROOK]) | queens
+
+    side = colour.opposite
+    depth = 0
+    while True:
+        side_attackers = attackers & board.get_colour_occupancy(side)
+        if not side_attackers:
+            break
+
+        # Least valuable attacker
+        for piece in Piece:
+            piece_attackers = side_attackers & int(bitboards[side][piece])
+            if piece_attackers:
+                break
+
+        # The king can't recapture onto a square the other side still attacks
+        if piece == Piece.KING and attackers & board.get_colour_occupancy(side.opposite):
+            break
+
+        depth += 1
+        gains[depth] = SEE_VALUES[piece_on_target] - gains[depth - 1]
+        piece_on_target = piece
+        occupancy ^= piece_attackers & -piece_attackers
+        # Sliders lined up behind the piece which just captured now attack the target
+        attackers |= int(move_generator.get_bishop_attacks(target, occupancy)) & diagonal_sliders
+        attackers |= int(move_generator.get_rook_attacks(target, occupancy)) & orthogonal_sliders
+        attackers &= occupancy
+        side = side.opposite
+
+    # Each side only continues the exchange if that is better for it than stopping
+    while depth > 0:
+        gains[depth - 1] = -max(-gains[depth - 1], gains[depth])
+        depth -= 1
+
+    return gains[0]
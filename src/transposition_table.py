@@ -0,0 +1,133 @@
+from array import array
+from constants import Bound
+
+'''
+    Each entry takes 16 bytes, split over two preallocated arrays of 64 bit ints:
+    keys[i] holds the full zobrist key of the position, for verifying a probe
+    data[i] packs the rest of the entry:
+    bits 0-15   best move, 16 bit encoded
+    bits 16-31  score, offset by 2^15 so it is stored unsigned
+    bits 32-39  depth
+    bits 40-41  bound, 0 for an empty entry
+    bits 42-47  age of the search which stored the entry
+
+    Entries are grouped into buckets, and a key can only be stored in its own bucket.
+'''
+
+ENTRY_SIZE = 16
+SCORE_OFFSET = 1 << 15
+AGE_MASK = 0x3F
+
+
+class TranspositionTable:
+    def __init__(self, size_mb: int = 16, bucket_size: int = 4):
+        self.bucket_size = bucket_size
+
+        # The number of buckets is rounded down to a power of two, so the bucket index is a mask of the key
+        num_buckets = 1
+        while num_buckets * 2 * bucket_size * ENTRY_SIZE <= size_mb * 1024 * 1024:
+            num_buckets *= 2
+        self.bucket_mask = num_buckets - 1
+        self.num_entries = num_buckets * bucket_size
+
+        self.keys = array('Q', bytes(8 * self.num_entries))
+        self.data = array('Q', bytes(8 * self.num_entries))
+        self.age = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.overwrites = 0
+
+
+    def clear(self):
+        self.keys = array('Q', bytes(8 * self.num_entries))
+        self.data = array('Q', bytes(8 * self.num_entries))
+        self.age = 0
+        self.reset_stats()
+
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.overwrites = 0
+
+
+    def new_search(self):
+        '''
+            Called at the start of every search, so entries from earlier searches can be told apart
+            and replaced first
+        '''
+        self.age = (self.age + 1) & AGE_MASK
+
+
+    def probe(self, key: int) -> tuple[int, Bound, int, int] | None:
+        '''
+            Returns (depth, bound, score, move) stored for the position, or None if it isn't in the table
+        '''
+        start = (key & self.bucket_mask) * self.bucket_size
+        for index in range(start, start + self.bucket_size):
+            if self.keys[index] == key:
+                data = self.data[index]
+                if data >> 40 & 0b11:
+                    self.hits += 1
+                    # Refresh the age, as the entry is still useful to this search
+                    self.data[index] = (data & ~(AGE_MASK << 42)) | (self.age << 42)
+                    return (data >> 32) & 0xFF, Bound(data >> 40 & 0b11), ((data >> 16) & 0xFFFF) - SCORE_OFFSET, data & 0xFFFF
+
+        self.misses += 1
+        return None
+
+
+    def store(self, key: int, depth: int, bound: Bound, score: int, move: int):
+        '''
+            Replacement within a bucket, in order of preference:
+            1. The entry for the same position. Its best move is kept if we don't have one
+            2. An empty entry
+            3. The entry with the lowest depth, where every search an entry is old counts as
+            several plies of depth, so stale entries are replaced before deep current ones
+        '''
+        start = (key & self.bucket_mask) * self.bucket_size
+        replace_index = start
+        replace_worth = None
+        for index in range(start, start + self.bucket_size):
+            data = self.data[index]
+            if self.keys[index] == key:
+                if move == 0:
+                    move = data & 0xFFFF
+                replace_index = index
+                break
+
+            if data >> 40 & 0b11 == 0:
+                replace_index = index
+                break
+
+            age_difference = (self.age - (data >> 42)) & AGE_MASK
+            worth = ((data >> 32) & 0xFF) - 8 * age_difference
+            if replace_worth is None or worth < replace_worth:
+                replace_index = index
+                replace_worth = worth
+        else:
+            self.overwrites += 1
+
+        self.keys[replace_index] = key
+        self.data[replace_index] = (
+            move
+            | (score + SCORE_OFFSET) << 16
+            | min(max(depth, 0), 0xFF) << 32
+            | bound << 40
+            | self.age << 42
+        )
+
+
+    def hashfull(self) -> int:
+        '''
+            Permille of the table used by the current search, sampled from the first 1000 entries
+        '''
+        sample = min(1000, self.num_entries)
+        used = 0
+        for index in range(sample):
+            data = self.data[index]
+            if data >> 40 & 0b11 and (data >> 42) == self.age:
+                used += 1
+
+        return used * 1000 // sample
@@ -0,0 +1,267 @@
+import sys
+import threading
+from typing import Callable, TextIO
+from constants import Colour, Piece
+from board import Board
+from int_board import IntBoard
+from move_generator import MoveGenerator
+from move import move_to_string
+from search import Searcher, SearchLimits, SearchReport
+from transposition_table import TranspositionTable
+
+'''
+    Headless engine speaking the UCI protocol on stdin and stdout, for GUIs and tournament managers.
+    http://wbec-ridderkerk.nl/html/UCIProtocol.html
+
+    Searches run on a worker thread, so the main thread keeps reading commands while one is running,
+    and stop and isready are answered straight away. Only one search runs at a time, and any command
+    which changes the position or the engine's state waits for the running one to finish first.
+'''
+
+ENGINE_NAME = "lamingt chess"
+ENGINE_AUTHOR = "lamingt"
+DEFAULT_HASH_MB = 16
+MAX_HASH_MB = 1024
+# Milliseconds kept back from every move, for the time taken to send it to the GUI
+MOVE_OVERHEAD = 30
+
+
+class UciEngine:
+    def __init__(self, output: Callable[[str], None] | None = None):
+        self.output = output if output is not None else self._print
+        self.output_lock = threading.Lock()
+        self.move_generator = MoveGenerator()
+        self.searcher = Searcher(self.move_generator, TranspositionTable(DEFAULT_HASH_MB))
+        self.board = IntBoard()
+        self.threads = 1
+
+        self.search_thread = None
+        # Set when a search which mustn't send its best move on its own, an infinite or ponder
+        # search, is allowed to send it by stop or ponderhit
+        self.release = threading.Event()
+        self.ponder_limits = None
+
+
+    def _print(self, line: str):
+        with self.output_lock:
+            sys.stdout.write(line + "\n")
+            sys.stdout.flush()
+
+
+    def run(self, input_stream: TextIO = sys.stdin):
+        '''
+            Handles commands until quit or the end of the input
+        '''
+        for line in input_stream:
+            if not self.handle(line):
+                break
+
+        self.stop_search()
+
+
+    def handle(self, line: str) -> bool:
+        '''
+            Handles one command. Returns False on quit. Unknown commands are ignored, as the protocol asks,
+            and a malformed one is reported and ignored, so one bad line can't take the engine down
+        '''
+        tokens = line.split()
+        if not tokens:
+            return True
+
+        command, args = tokens[0], tokens[1:]
+        if command == "quit":
+            return False
+        try:
+            self._dispatch(command, args)
+        except (ValueError, KeyError, IndexError) as exception:
+            self.output(f"info string ignoring malformed command {line.strip()!r}: {exception}")
+
+        return True
+
+
+    def _dispatch(self, command: str, args: list[str]):
+        if command == "uci":
+            self.output(f"id name {ENGINE_NAME}")
+            self.output(f"id author {ENGINE_AUTHOR}")
+            self.output(f"option name Hash type spin default {DEFAULT_HASH_MB} min 1 max {MAX_HASH_MB}")
+            self.output("option name Threads type spin default 1 min 1 max 1")
+            self.output("option name Ponder type check default false")
+            self.output("uciok")
+        elif command == "isready":
+            self.output("readyok")
+        elif command == "ucinewgame":
+            self.stop_search()
+            self.searcher.transposition_table.clear()
+            self.searcher.pawn_table.clear()
+            self.board = IntBoard()
+        elif command == "setoption":
+            self.set_option(args)
+        elif command == "position":
+            self.set_position(args)
+        elif command == "go":
+            self.go(args)
+        elif command == "stop":
+            self.stop_search()
+        elif command == "ponderhit":
+            self.ponderhit()
+
+
+    def set_option(self, args: list[str]):
+        # setoption name <name> [value <value>], where the name can contain spaces
+        if "name" not in args:
+            return
+        name_start = args.index("name") + 1
+        value_start = args.index("value") if "value" in args else len(args)
+        name = " ".join(args[name_start:value_start]).lower()
+        value = " ".join(args[value_start + 1:])
+
+        self.stop_search()
+        if name == "hash":
+            size_mb = min(max(int(value), 1), MAX_HASH_MB)
+            self.searcher.transposition_table = TranspositionTable(size_mb)
+        elif name == "threads":
+            # The search is single threaded, so more threads are accepted but not used
+            self.threads = max(int(value), 1)
+
+
+    def set_position(self, args: list[str]):
+        '''
+            position [startpos | fen <fen>] [moves <move> ...]
+        '''
+        self.stop_search()
+        moves_start = args.index("moves") if "moves" in args else len(args)
+        if args and args[0] == "fen":
+            board = IntBoard.from_fen(" ".join(args[1:moves_start]))
+            for colour in Colour:
+                if int(board.bitboards[colour][Piece.KING]).bit_count() != 1:
+                    raise ValueError("the position needs one king of each colour")
+        else:
+            board = IntBoard()
+
+        for move_string in args[moves_start + 1:]:
+            move = self.parse_move(board, move_string)
+            if move is None:
+                self.output(f"info string illegal move {move_string}")
+                break
+            board.make_move(move)
+
+        self.board = board
+
+
+    def parse_move(self, board: Board, move_string: str) -> int | None:
+        for move in self.move_generator.get_legal_moves(board, board.side_to_move):
+            if move_to_string(move) == move_string:
+                return move
+
+        return None
+
+
+    def go(self, args: list[str]):
+        self.stop_search()
+
+        options = {}
+        flags = set()
+        index = 0
+        while index < len(args):
+            if args[index] in ("infinite", "ponder"):
+                flags.add(args[index])
+                index += 1
+            elif index + 1 < len(args):
+                options[args[index]] = args[index + 1]
+                index += 2
+            else:
+                index += 1
+
+        limits = self._limits(options)
+        self.ponder_limits = None
+        if "ponder" in flags:
+            # Pondering searches without time or node limits, and switches to the real ones on ponderhit
+            self.ponder_limits = limits
+            limits = SearchLimits(depth=limits.depth)
+        hold_best_move = "infinite" in flags or "ponder" in flags
+
+        self.release.clear()
+        # Cleared here rather than by the search, so a stop sent before the thread gets going still stops it
+        self.searcher.stopped = False
+        self.search_thread = threading.Thread(target=self._search, args=(self.board, limits, hold_best_move), daemon=True)
+        self.search_thread.start()
+
+
+    def _limits(self, options: dict[str, str]) -> SearchLimits:
+        depth = int(options["depth"]) if "depth" in options else None
+        nodes = int(options["nodes"]) if "nodes" in options else None
+        if "movetime" in options:
+            movetime = max(int(options["movetime"]) - MOVE_OVERHEAD, 1) / 1000
+            return SearchLimits(depth, nodes, movetime, movetime)
+
+        time_option, increment_option = ("wtime", "winc") if self.board.side_to_move == Colour.WHITE else ("btime", "binc")
+        if time_option in options:
+            time_left = max(int(options[time_option]) - MOVE_OVERHEAD, 1) / 1000
+            increment = int(options.get(increment_option, 0)) / 1000
+            moves_to_go = int(options["movestogo"]) if "movestogo" in options else None
+            limits = SearchLimits.from_clock(time_left, increment, moves_to_go)
+            limits.depth = depth
+            limits.nodes = nodes
+            return limits
+
+        return SearchLimits(depth, nodes)
+
+
+    def _search(self, board: Board, limits: SearchLimits, hold_best_move: bool):
+        last_report = None
+
+        def on_iteration(report: SearchReport):
+            nonlocal last_report
+            last_report = report
+            self.output(report.to_info_string())
+
+        best_move, _ = self.searcher.search(board, limits, on_iteration, reset_stop=False)
+        # Infinite and ponder searches can run out of depth before they are told to stop, but the
+        # best move still can't be sent until they are
+        if hold_best_move:
+            self.release.wait()
+
+        if best_move == 0:
+            self.output("bestmove 0000")
+        elif last_report is not None and len(last_report.pv) > 1 and last_report.pv[0] == best_move:
+            self.output(f"bestmove {move_to_string(best_move)} ponder {move_to_string(last_report.pv[1])}")
+        else:
+            self.output(f"bestmove {move_to_string(best_move)}")
+
+
+    def stop_search(self):
+        '''
+            Stops the running search, if there is one, and waits for it to send its best move
+        '''
+        if self.search_thread is None:
+            return
+
+        self.searcher.stop()
+        self.release.set()
+        self.search_thread.join()
+        self.search_thread = None
+
+
+    def ponderhit(self):
+        '''
+            The opponent played the move we were pondering on, so the search carries on with the limits
+            it was given, counted from now
+        '''
+        if self.search_thread is None or self.ponder_limits is None:
+            return
+
+        limits = self.ponder_limits
+        self.ponder_limits = None
+        self.searcher.set_limits(limits)
+        # Without any limits the search carries on until stop, as an infinite one does. Otherwise a
+        # ponder search which has already finished sends its move now
+        if limits.depth is not None or limits.nodes is not None or limits.hard_time is not None:
+            self.release.set()
+
+
+def main():
+    UciEngine().run()
+
+
+if __name__ == "__main__":
+    main()
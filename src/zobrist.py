@@ -0,0 +1,63 @@
+import random
+from constants import Piece, Colour
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from board import Board
+
+'''
+    Zobrist hashing gives every (colour, piece, square) combination, the side to move, every set
+    of castling rights and every en passant file a random 64 bit key. The hash of a position is
+    the xor of the keys of everything in it, so a move only needs to xor in and out the keys of
+    what it changed.
+'''
+
+# Fixed seed so keys are identical between runs and processes
+_rng = random.Random(0x5EED)
+
+PIECE_KEYS = [[[_rng.getrandbits(64) for _ in range(64)] for _ in Piece] for _ in Colour]
+# Xored in when black is to move
+SIDE_KEY = _rng.getrandbits(64)
+# Indexed by the whole 4 bit castling rights value
+CASTLING_KEYS = [_rng.getrandbits(64) for _ in range(16)]
+# Indexed by the file of the en passant target square
+EP_KEYS = [_rng.getrandbits(64) for _ in range(8)]
+
+
+def compute_hash(board: "Board") -> int:
+    '''
+        Computes the hash of a position from scratch. Used to initialise a board's key, and to
+        verify the incrementally updated one
+    '''
+    key = 0
+    for colour in Colour:
+        for piece in Piece:
+            bitboard = int(board.bitboards[colour][piece])
+            while bitboard:
+                square = (bitboard & -bitboard).bit_length() - 1
+                bitboard &= bitboard - 1
+                key ^= PIECE_KEYS[colour][piece][square]
+
+    if board.side_to_move == Colour.BLACK:
+        key ^= SIDE_KEY
+    key ^= CASTLING_KEYS[board.castling_rights]
+    if board.ep_target != -1:
+        key ^= EP_KEYS[board.ep_target % 8]
+
+    return key
+
+
+def compute_pawn_hash(board: "Board") -> int:
+    '''
+        Computes the pawn key of a position from scratch, the xor of the keys of its pawns only, which
+        identifies the pawn structure for the pawn hash table
+    '''
+    key = 0
+    for colour in Colour:
+        bitboard = int(board.bitboards[colour][Piece.PAWN])
+        while bitboard:
+            square = (bitboard & -bitboard).bit_length() - 1
+            bitboard &= bitboard - 1
+            key ^= PIECE_KEYS[colour][Piece.PAWN][square]
+
+    return key